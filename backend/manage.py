@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the ICD201 Course Schema API
+
+    python manage.py rebuild-resource-usage
+    python manage.py check-resource-usage
+    python manage.py check-query-plans
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from utils import database
+from services.resource_usage import resource_usage_view
+
+async def rebuild_resource_usage() -> int:
+    """Recompute the whole resource_usage view"""
+    count = await resource_usage_view.rebuild(database.db)
+    print(f"Rebuilt usage of {count} resources")
+    return 0
+
+async def check_resource_usage() -> int:
+    """Compare the resource_usage view with a full recomputation"""
+    differences = await resource_usage_view.check(database.db)
+    for difference in differences:
+        print(f"{difference['resource_id']}: stored {difference['stored']}, expected {difference['expected']}")
+    if differences:
+        print(f"{len(differences)} resources out of date, run rebuild-resource-usage")
+        return 1
+    print("Resource usage is consistent")
+    return 0
+
+async def check_query_plans() -> int:
+    """Explain the query shapes of the routes and report collection scans"""
+    try:
+        await database.DatabaseManager.verify_query_plans()
+    except RuntimeError as e:
+        print(e)
+        return 1
+    print("Every query shape uses an index")
+    return 0
+
+COMMANDS = {
+    "rebuild-resource-usage": rebuild_resource_usage,
+    "check-resource-usage": check_resource_usage,
+    "check-query-plans": check_query_plans,
+}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="ICD201 Course Schema API maintenance")
+    parser.add_argument("command", choices=COMMANDS)
+    args = parser.parse_args()
+
+    database.init_database()
+    try:
+        return asyncio.run(COMMANDS[args.command]())
+    finally:
+        database.client.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
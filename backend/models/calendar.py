@@ -34,4 +34,9 @@ class WeekView(BaseModel):
     start_date: str
     end_date: str
     events: List[CalendarEvent] = []
-    total_hours: int = 0
\ No newline at end of file
+    total_hours: int = 0
+
+class ConflictCheck(BaseModel):
+    date: str
+    resources: List[str] = []
+    event_id: Optional[int] = None  # event being moved, ignored in its own slots
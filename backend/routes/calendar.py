@@ -1,14 +1,42 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
 from datetime import datetime, timedelta
-from models.calendar import CalendarEvent, CalendarEventCreate, CalendarEventUpdate, WeekView
+from bisect import bisect_right
+import base64
+import json
+from pymongo.errors import BulkWriteError
+from models.calendar import CalendarEvent, CalendarEventCreate, CalendarEventUpdate, WeekView, ConflictCheck
 from utils.database import db, DatabaseManager
+from utils.single_flight import single_flight
+from services.conflict_engine import ConflictEngine
+from services.occupancy_index import OccupancyIndex, occupancy_index
 
 router = APIRouter(prefix="/api/calendar", tags=["calendar"])
 
+def _encode_cursor(event: dict) -> str:
+    """Opaque keyset cursor pointing after an event in (date, id) order"""
+    raw = json.dumps([event.get("date"), event.get("id")]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        date, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return date, event_id
+
 @router.get("/events", response_model=List[CalendarEvent])
-async def get_events(unit_id: Optional[int] = None, resource_id: Optional[str] = None):
-    """Get all calendar events with optional filtering"""
+@single_flight
+async def get_events(
+    unit_id: Optional[int] = None,
+    resource_id: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """Get calendar events with optional filtering and keyset pagination"""
     filter_query = {}
     
     if unit_id:
@@ -17,24 +45,50 @@ async def get_events(unit_id: Optional[int] = None, resource_id: Optional[str] =
     if resource_id:
         filter_query["resources"] = resource_id
     
-    events = await db.calendar_events.find(filter_query).sort("date", 1).to_list(1000)
-    return DatabaseManager.serialize_docs(events)
+    if start or end:
+        filter_query["date"] = {}
+        if start:
+            filter_query["date"]["$gte"] = start
+        if end:
+            filter_query["date"]["$lte"] = end
+    
+    if cursor:
+        after_date, after_id = _decode_cursor(cursor)
+        filter_query["$or"] = [
+            {"date": {"$gt": after_date}},
+            {"date": after_date, "id": {"$gt": after_id}}
+        ]
+    
+    query = db.calendar_events.find(
+        filter_query, DatabaseManager.projection(CalendarEvent)
+    ).sort([("date", 1), ("id", 1)])
+    
+    headers = {}
+    if limit is None:
+        events = await query.to_list(None)
+    else:
+        # Fetch one extra event to know whether another page follows
+        events = await query.limit(limit + 1).to_list(None)
+        if len(events) > limit:
+            events = events[:limit]
+            headers["X-Next-Cursor"] = _encode_cursor(events[-1])
+    
+    return ORJSONResponse(
+        [DatabaseManager.with_defaults(CalendarEvent, event) for event in events], headers=headers
+    )
 
 @router.get("/events/{event_id}", response_model=CalendarEvent)
+@single_flight
 async def get_event(event_id: int):
     """Get a specific calendar event"""
-    event = await db.calendar_events.find_one({"id": event_id})
+    event = await db.calendar_events.find_one({"id": event_id}, DatabaseManager.projection(CalendarEvent))
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
-    return DatabaseManager.serialize_doc(event)
+    return ORJSONResponse(DatabaseManager.with_defaults(CalendarEvent, event))
 
 @router.post("/events", response_model=CalendarEvent)
 async def create_event(event: CalendarEventCreate):
     """Create a new calendar event"""
-    # Get the next event ID
-    last_event = await db.calendar_events.find_one(sort=[("id", -1)])
-    next_id = (last_event["id"] + 1) if last_event else 1
-    
     # Validate unit exists
     unit = await db.units.find_one({"id": event.unit_id})
     if not unit:
@@ -53,6 +107,9 @@ async def create_event(event: CalendarEventCreate):
         if not resource:
             raise HTTPException(status_code=400, detail=f"Resource {resource_id} not found")
     
+    # Get the next event ID
+    next_id = await DatabaseManager.reserve_ids("calendar_events")
+    
     event_dict = event.dict()
     event_dict.update({
         "id": next_id,
@@ -62,8 +119,88 @@ async def create_event(event: CalendarEventCreate):
     
     result = await db.calendar_events.insert_one(event_dict)
     created_event = await db.calendar_events.find_one({"_id": result.inserted_id})
+    occupancy_index.add_event(created_event)
+    DatabaseManager.notify_write("calendar_events")
     return DatabaseManager.serialize_doc(created_event)
 
+@router.post("/events/bulk")
+async def create_events_bulk(events: List[CalendarEventCreate]):
+    """Create many calendar events at once, reporting errors per item"""
+    # Validate every reference with one query per collection
+    unit_ids = list({event.unit_id for event in events})
+    units = await db.units.find(
+        {"id": {"$in": unit_ids}}, {"_id": 0, "id": 1, "lessons.id": 1}
+    ).to_list(None)
+    lessons_by_unit = {
+        unit["id"]: {lesson.get("id") for lesson in unit.get("lessons", [])}
+        for unit in units
+    }
+    
+    resource_ids = list({r for event in events for r in event.resources})
+    resources = await db.resources.find(
+        {"id": {"$in": resource_ids}}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    known_resources = {resource["id"] for resource in resources}
+    
+    errors = []
+    valid = []
+    valid_indexes = []
+    for index, event in enumerate(events):
+        if event.unit_id not in lessons_by_unit:
+            errors.append({"index": index, "detail": "Unit not found"})
+            continue
+        if event.lesson_id and event.lesson_id not in lessons_by_unit[event.unit_id]:
+            errors.append({"index": index, "detail": "Lesson not found in unit"})
+            continue
+        missing = next((r for r in event.resources if r not in known_resources), None)
+        if missing is not None:
+            errors.append({"index": index, "detail": f"Resource {missing} not found"})
+            continue
+        valid.append(event)
+        valid_indexes.append(index)
+    
+    if not valid:
+        return {"created": [], "errors": errors}
+    
+    # Allocate a contiguous block of event IDs
+    first_id = await DatabaseManager.reserve_ids("calendar_events", len(valid))
+    
+    now = datetime.utcnow()
+    event_dicts = []
+    for offset, event in enumerate(valid):
+        event_dict = event.dict()
+        event_dict.update({
+            "id": first_id + offset,
+            "created_at": now,
+            "updated_at": now
+        })
+        event_dicts.append(event_dict)
+    
+    # Unordered, so one rejected insert does not stop the others
+    failed = {}
+    try:
+        await db.calendar_events.insert_many(event_dicts, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+    
+    created = []
+    for offset, event_dict in enumerate(event_dicts):
+        error = failed.get(offset)
+        if error is None:
+            created.append(event_dict)
+        elif error.get("code") == 11000:
+            errors.append({"index": valid_indexes[offset], "detail": f"Event {event_dict['id']} already exists"})
+        else:
+            errors.append({"index": valid_indexes[offset], "detail": error.get("errmsg", "Insert failed")})
+    errors.sort(key=lambda error: error["index"])
+    
+    for event_dict in created:
+        occupancy_index.add_event(event_dict)
+    if created:
+        DatabaseManager.notify_write("calendar_events")
+    
+    return {"created": DatabaseManager.serialize_docs(created), "errors": errors}
+
 @router.put("/events/{event_id}", response_model=CalendarEvent)
 async def update_event(event_id: int, event_update: CalendarEventUpdate):
     """Update an existing calendar event"""
@@ -96,6 +233,8 @@ async def update_event(event_id: int, event_update: CalendarEventUpdate):
     )
     
     updated_event = await db.calendar_events.find_one({"id": event_id})
+    occupancy_index.add_event(updated_event)
+    DatabaseManager.notify_write("calendar_events")
     return DatabaseManager.serialize_doc(updated_event)
 
 @router.delete("/events/{event_id}")
@@ -105,9 +244,13 @@ async def delete_event(event_id: int):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Event not found")
     
+    occupancy_index.remove_event(event_id)
+    DatabaseManager.notify_write("calendar_events")
+    
     return {"message": "Event deleted successfully"}
 
 @router.get("/weeks", response_model=List[WeekView])
+@single_flight
 async def get_weeks_view():
     """Get calendar organized by weeks"""
     # Get course settings for date range
@@ -118,68 +261,86 @@ async def get_weeks_view():
     start_date = datetime.fromisoformat(settings["start_date"])
     total_weeks = settings["total_weeks"]
     
-    weeks = []
-    
+    week_starts = []
+    week_ends = []
     for week_num in range(1, total_weeks + 1):
         week_start = start_date + timedelta(weeks=week_num - 1)
         week_end = week_start + timedelta(days=6)
-        
-        # Get events for this week
-        week_events = await db.calendar_events.find({
+        week_starts.append(week_start.strftime("%Y-%m-%d"))
+        week_ends.append(week_end.strftime("%Y-%m-%d"))
+    
+    week_events = [[] for _ in range(total_weeks)]
+    
+    if total_weeks > 0:
+        # Fetch the whole term in a single range query, then bucket by week
+        events = await db.calendar_events.find({
             "date": {
-                "$gte": week_start.strftime("%Y-%m-%d"),
-                "$lte": week_end.strftime("%Y-%m-%d")
+                "$gte": week_starts[0],
+                "$lte": week_ends[-1]
             }
-        }).sort("date", 1).to_list(1000)
+        }, DatabaseManager.projection(CalendarEvent)).sort("date", 1).to_list(None)
         
-        total_hours = sum(event.get("duration", 0) for event in week_events)
+        for event in events:
+            event_date = event.get("date")
+            index = bisect_right(week_starts, event_date) - 1
+            # Weeks are contiguous, but keep the inclusive upper bound check so
+            # values such as "2025-01-21T10:00" stay out of the view as before
+            if index >= 0 and event_date <= week_ends[index]:
+                week_events[index].append(event)
+    
+    weeks = []
+    
+    for week_num in range(1, total_weeks + 1):
+        events = week_events[week_num - 1]
+        total_hours = sum(event.get("duration", 0) for event in events)
         
-        weeks.append(WeekView(
-            week_number=week_num,
-            start_date=week_start.strftime("%Y-%m-%d"),
-            end_date=week_end.strftime("%Y-%m-%d"),
-            events=DatabaseManager.serialize_docs(week_events),
-            total_hours=total_hours
-        ))
-    
-    return weeks
+        weeks.append({
+            "week_number": week_num,
+            "start_date": week_starts[week_num - 1],
+            "end_date": week_ends[week_num - 1],
+            "events": events,
+            "total_hours": total_hours
+        })
+    
+    return ORJSONResponse([DatabaseManager.with_defaults(WeekView, week) for week in weeks])
 
 @router.get("/conflicts")
+@single_flight
 async def detect_conflicts():
-    """Detect resource conflicts in calendar"""
-    conflicts = []
-    
-    # Get all events grouped by date
-    events = await db.calendar_events.find().sort("date", 1).to_list(1000)
-    
-    # Group events by date
-    events_by_date = {}
-    for event in events:
-        date = event.get("date")
-        if date not in events_by_date:
-            events_by_date[date] = []
-        events_by_date[date].append(event)
-    
-    # Check for resource conflicts on same day
-    for date, day_events in events_by_date.items():
-        resource_usage = {}
-        
-        for event in day_events:
-            for resource_id in event.get("resources", []):
-                if resource_id not in resource_usage:
-                    resource_usage[resource_id] = 0
-                resource_usage[resource_id] += 1
-        
-        # Check if any resource is over-used
-        for resource_id, usage_count in resource_usage.items():
-            if usage_count > 1:
-                resource = await db.resources.find_one({"id": resource_id})
-                conflicts.append({
-                    "date": date,
-                    "resource_id": resource_id,
-                    "resource_name": resource.get("name", "") if resource else resource_id,
-                    "conflict_count": usage_count,
-                    "events": [e for e in day_events if resource_id in e.get("resources", [])]
-                })
-    
-    return {"conflicts": conflicts}
\ No newline at end of file
+    """Detect resource over-subscription in calendar"""
+    engine = await ConflictEngine.load(db)
+    
+    if not occupancy_index.ready:
+        conflicts = await engine.detect_in_db(db)
+        return {"conflicts": conflicts}
+    
+    # Only load the events of over-subscribed slots
+    slots = occupancy_index.over_subscribed(engine)
+    event_ids = sorted({event_id for _, _, ids in slots for event_id in ids})
+    events = await db.calendar_events.find({"id": {"$in": event_ids}}, {"_id": 0}).to_list(None)
+    events_by_id = {event["id"]: event for event in events}
+    
+    conflicts = [
+        engine.build_conflict(date, resource_id, [events_by_id[i] for i in ids if i in events_by_id])
+        for date, resource_id, ids in slots
+    ]
+    return {"conflicts": conflicts}
+
+@router.post("/conflicts/check")
+async def check_conflicts(check: ConflictCheck):
+    """Check whether booking resources on a date would cause a conflict"""
+    engine = await ConflictEngine.load(db, check.resources)
+    
+    index = occupancy_index
+    if not index.ready:
+        # Index only the bookings of the requested day
+        index = OccupancyIndex()
+        cursor = db.calendar_events.find(
+            {"date": check.date, "resources": {"$in": check.resources}},
+            {"_id": 0, "id": 1, "unit_id": 1, "lesson_id": 1, "date": 1, "resources": 1}
+        )
+        async for event in cursor:
+            index.add_event(event)
+    
+    conflicts = index.check(check.date, check.resources, engine, check.event_id)
+    return {"has_conflicts": bool(conflicts), "conflicts": conflicts}
@@ -0,0 +1,114 @@
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import Any, Dict, List, Optional
+import asyncio
+import gzip
+import orjson
+from models.unit import Unit
+from models.resource import Resource, ResourceUsage
+from models.calendar import CalendarEvent
+from models.settings import CourseSettings
+from utils.database import db, DatabaseManager
+from utils.conditional import collections_etag, etag_matches
+from utils.single_flight import single_flight
+from services.resource_usage import resource_usage_view
+
+router = APIRouter(prefix="/api/course", tags=["course"])
+
+# Sections of a snapshot, with the model of their documents and the
+# collections their content depends on
+SNAPSHOT_SECTIONS = {
+    "settings": (CourseSettings, ("course_settings",)),
+    "units": (Unit, ("units",)),
+    "resources": (Resource, ("resources",)),
+    "events": (CalendarEvent, ("calendar_events",)),
+    "usage": (ResourceUsage, ("units", "resources", "course_settings")),
+}
+
+def _parse_fields(fields: Optional[str]) -> Dict[str, Optional[List[str]]]:
+    """Selected sections, each with its selected fields or None for all of them.
+
+    fields is a comma-separated list of sections, such as "units", and of
+    fields within them, such as "units.title" or "units.lessons.id".
+    """
+    if not fields:
+        return {section: None for section in SNAPSHOT_SECTIONS}
+
+    selection = {}
+    for item in fields.split(","):
+        section, _, field = item.strip().partition(".")
+        if section not in SNAPSHOT_SECTIONS:
+            raise HTTPException(status_code=400, detail=f"Unknown section: {section}")
+        if not field:
+            selection[section] = None
+            continue
+        if field.partition(".")[0] not in SNAPSHOT_SECTIONS[section][0].model_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {section}.{field}")
+        selected = selection.setdefault(section, [])
+        if selected is not None:
+            selected.append(field)
+
+    return {
+        section: _drop_nested(selected) if selected is not None else None
+        for section, selected in selection.items()
+    }
+
+def _drop_nested(fields: List[str]) -> List[str]:
+    """Sorted fields without those already covered by a selected parent.
+
+    Mongo rejects a projection holding both a field and one of its
+    children, such as "lessons" and "lessons.id", as a path collision.
+    """
+    kept = []
+    for field in sorted(set(fields)):
+        # Sorted order puts every parent before its children
+        if not any(field.startswith(parent + ".") for parent in kept):
+            kept.append(field)
+    return kept
+
+async def _load_section(section: str, selected: Optional[List[str]]) -> Any:
+    model = SNAPSHOT_SECTIONS[section][0]
+    if selected is None:
+        projection = DatabaseManager.projection(model)
+    else:
+        projection = {field: 1 for field in selected}
+        projection["_id"] = 0
+
+    if section == "settings":
+        return await DatabaseManager.cached_find_one("course_settings", {}, projection)
+    if section == "units":
+        return await DatabaseManager.cached_find("units", {}, projection)
+    if section == "resources":
+        return await DatabaseManager.cached_find("resources", {}, projection)
+    if section == "events":
+        return await db.calendar_events.find({}, projection).sort([("date", 1), ("id", 1)]).to_list(None)
+    return await resource_usage_view.all(db, projection)
+
+@router.get("/snapshot")
+@single_flight
+async def get_course_snapshot(
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """Get settings, units, resources, events and resource usage in one response"""
+    selection = _parse_fields(fields)
+    encoding = "gzip" if "gzip" in (accept_encoding or "").lower() else "identity"
+
+    # Tag before reading, so the content is at least as new as the tag
+    etag = collections_etag(
+        [collection for section in selection for collection in SNAPSHOT_SECTIONS[section][1]],
+        orjson.dumps(selection, option=orjson.OPT_SORT_KEYS).decode(),
+        encoding
+    )
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    sections = list(selection)
+    documents = await asyncio.gather(*[_load_section(section, selection[section]) for section in sections])
+    body = orjson.dumps(dict(zip(sections, documents)))
+
+    if encoding == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
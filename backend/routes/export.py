@@ -1,78 +1,300 @@
 from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import StreamingResponse
-from typing import List
-import io
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
+from typing import BinaryIO, List, Iterator, Dict, Optional, Tuple, Union
+import asyncio
+import os
+import tempfile
+import zipfile
 from datetime import datetime
+from pathlib import Path
 from models.settings import PDFExportOptions
-from utils.database import db, DatabaseManager
-from services.pdf_generator import PDFGenerator
+from utils.database import db
+from services.pdf_pool import pdf_render_pool, RenderPoolSaturated
+from services.pdf_cache import PDFCache, pdf_cache
+from services.export_jobs import export_job_worker
+from services.exporters import EXPORTERS, StreamSink
+from services.export_datasets import DATASETS
+from services.course_data import load_course_data, PREVIEW_PROJECTIONS
+from services.resource_usage import compute_resource_usage
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
+# Size of the pieces a PDF is streamed in
+CHUNK_SIZE = 64 * 1024
+
+# Most variants a single batch export may render
+MAX_BATCH_VARIANTS = int(os.environ.get("EXPORT_BATCH_MAX_VARIANTS", "64"))
+
+def _iter_chunks(data: bytes) -> Iterator[bytes]:
+    """Stream bytes in fixed-size chunks without copying the whole buffer"""
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_SIZE):
+        yield bytes(view[start:start + CHUNK_SIZE])
+
 @router.post("/pdf")
 async def export_pdf(options: PDFExportOptions):
     """Generate and download PDF of course schema"""
     try:
         # Get course data
-        settings = await db.course_settings.find_one()
-        if not settings:
-            raise HTTPException(status_code=404, detail="Course settings not found")
-        
-        # Get units (filter if specific units selected)
-        if options.selected_units:
-            units = await db.units.find({"id": {"$in": options.selected_units}}).to_list(1000)
-        else:
-            units = await db.units.find().to_list(1000)
+        try:
+            settings, units, resources, events = await load_course_data(options)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
         
-        if not units:
-            raise HTTPException(status_code=404, detail="No units found")
-        
-        # Get resources if needed
-        resources = []
-        if options.include_resources:
-            resources = await db.resources.find().to_list(1000)
+        filename = f"schema_cours_icd201_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         
-        # Get calendar events if needed
-        events = []
-        if options.include_schedule:
-            events = await db.calendar_events.find().sort("date", 1).to_list(1000)
+        # Reuse the last render of identical data and options
+        cache_key = PDFCache.key(settings, units, resources, events, options)
+        pdf_buffer = pdf_cache.get(cache_key)
         
-        # Generate PDF
-        pdf_generator = PDFGenerator()
-        pdf_buffer = pdf_generator.generate_course_pdf(
-            settings=settings,
-            units=units,
-            resources=resources,
-            events=events,
-            options=options
-        )
+        if isinstance(pdf_buffer, bytes):
+            return StreamingResponse(
+                _iter_chunks(pdf_buffer),
+                media_type="application/pdf",
+                headers={
+                    "Content-Disposition": f"attachment; filename={filename}",
+                    "Content-Length": str(len(pdf_buffer))
+                }
+            )
+        if pdf_buffer is not None:
+            return StreamingResponse(
+                _iter_file_chunks(pdf_buffer),
+                media_type="application/pdf",
+                headers={
+                    "Content-Disposition": f"attachment; filename={filename}",
+                    "Content-Length": str(os.fstat(pdf_buffer.fileno()).st_size)
+                }
+            )
         
-        # Create response
-        filename = f"schema_cours_icd201_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        # Generate PDF in the render pool, sending only plain documents. The
+        # worker writes to a temporary file which is streamed then removed.
+        fd, path = tempfile.mkstemp(prefix="icd201_", suffix=".pdf")
+        os.close(fd)
+        try:
+            await pdf_render_pool.render_to_file(
+                path,
+                settings=settings,
+                units=units,
+                resources=resources,
+                events=events,
+                options=options
+            )
+            pdf_cache.put_file(cache_key, path)
+        except BaseException:
+            os.unlink(path)
+            raise
         
-        return StreamingResponse(
-            io.BytesIO(pdf_buffer),
+        return FileResponse(
+            path,
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+            background=BackgroundTask(os.unlink, path)
         )
         
+    except HTTPException:
+        raise
+    except RenderPoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="PDF generation is busy, retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="PDF generation timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
 
+@router.post("/batch")
+async def export_pdf_batch(variants: List[PDFExportOptions]):
+    """Render several PDF variants from one data load and download them as a ZIP"""
+    if not variants:
+        raise HTTPException(status_code=400, detail="No export variants given")
+    if len(variants) > MAX_BATCH_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_VARIANTS} variants per batch")
+    
+    # Load the data every variant needs once
+    selected_units = []
+    if all(options.selected_units for options in variants):
+        selected_units = sorted({unit_id for options in variants for unit_id in options.selected_units})
+    try:
+        settings, units, resources, events = await load_course_data(PDFExportOptions(
+            include_resources=any(options.include_resources for options in variants),
+            include_schedule=any(options.include_schedule for options in variants),
+            selected_units=selected_units
+        ))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    filename = f"schemas_cours_icd201_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        _stream_batch(settings, units, resources, events, variants),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def _variant_name(index: int, options: PDFExportOptions) -> str:
+    units = "-".join(str(unit_id) for unit_id in options.selected_units) or "toutes"
+    return f"{index + 1:02d}_{options.detail_level}_unites_{units}"
+
+async def _stream_batch(settings: Dict, units: List[Dict], resources: List[Dict], events: List[Dict],
+                        variants: List[PDFExportOptions]):
+    """Write each variant into the ZIP as soon as its render finishes"""
+    # A batch never holds more render slots than the pool has workers, so
+    # interactive exports can still queue behind it
+    slots = asyncio.Semaphore(pdf_render_pool.max_workers)
+    tasks = []
+    for index, options in enumerate(variants):
+        variant_units = [
+            unit for unit in units
+            if not options.selected_units or unit.get("id") in options.selected_units
+        ]
+        tasks.append(asyncio.create_task(_render_variant(
+            _variant_name(index, options), slots, settings, variant_units,
+            resources if options.include_resources else [],
+            events if options.include_schedule else [],
+            options
+        )))
+    
+    sink = StreamSink()
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for finished in asyncio.as_completed(tasks):
+                name, pdf, error = await finished
+                if error is not None:
+                    archive.writestr(f"{name}_erreur.txt", error)
+                    continue
+                
+                with archive.open(f"{name}.pdf", "w") as entry:
+                    if isinstance(pdf, bytes):
+                        chunks = _iter_chunks(pdf)
+                    elif isinstance(pdf, Path):
+                        chunks = _iter_file_chunks(open(pdf, "rb"))
+                    else:
+                        chunks = _iter_file_chunks(pdf)
+                    for chunk in chunks:
+                        entry.write(chunk)
+                        if len(sink) >= CHUNK_SIZE:
+                            yield sink.drain()
+                if isinstance(pdf, Path):
+                    pdf.unlink(missing_ok=True)
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, tuple) and isinstance(result[1], Path):
+                result[1].unlink(missing_ok=True)
+            elif isinstance(result, tuple) and result[1] is not None and not isinstance(result[1], bytes):
+                result[1].close()
+
+def _iter_file_chunks(pdf_file: BinaryIO) -> Iterator[bytes]:
+    """Stream an open file in fixed-size chunks, closing it once read"""
+    with pdf_file:
+        while chunk := pdf_file.read(CHUNK_SIZE):
+            yield chunk
+
+async def _render_variant(name: str, slots: asyncio.Semaphore, settings: Dict, units: List[Dict],
+                          resources: List[Dict], events: List[Dict],
+                          options: PDFExportOptions) -> Tuple[str, Union[bytes, BinaryIO, Path, None], Optional[str]]:
+    """Render one batch variant, returning its name, the PDF bytes, cached file or
+    rendered file, and any error"""
+    if not units:
+        return name, None, "No units found"
+    
+    cache_key = PDFCache.key(settings, units, resources, events, options)
+    cached = pdf_cache.get(cache_key)
+    if cached is not None:
+        return name, cached, None
+    
+    fd, path = tempfile.mkstemp(prefix="icd201_", suffix=".pdf")
+    os.close(fd)
+    path = Path(path)
+    try:
+        async with slots:
+            while True:
+                try:
+                    await pdf_render_pool.render_to_file(
+                        str(path), settings, units, resources, events, options
+                    )
+                    break
+                except RenderPoolSaturated as e:
+                    await asyncio.sleep(e.retry_after)
+        pdf_cache.put_file(cache_key, str(path))
+        return name, path, None
+    except asyncio.CancelledError:
+        path.unlink(missing_ok=True)
+        raise
+    except asyncio.TimeoutError:
+        path.unlink(missing_ok=True)
+        return name, None, "PDF generation timed out"
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        return name, None, f"Error generating PDF: {str(e)}"
+
+@router.post("/jobs", status_code=202)
+async def create_export_job(options: PDFExportOptions):
+    """Queue a PDF export to be generated in the background"""
+    return await export_job_worker.enqueue(options)
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(job_id: str):
+    """Get the status and progress of an export job"""
+    job = await export_job_worker.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+@router.get("/jobs/{job_id}/file")
+async def download_export_job(job_id: str):
+    """Download the PDF generated by a finished export job"""
+    job = await export_job_worker.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export job is {job['status']}")
+    
+    path = export_job_worker.artifact_path(job_id)
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Export file has expired")
+    
+    return FileResponse(path, media_type="application/pdf", filename=job["file_name"])
+
+@router.post("/tables/{dataset}/{export_format}")
+async def export_table(dataset: str, export_format: str, options: PDFExportOptions):
+    """Stream units, lessons, resource usage or calendar events as CSV, XLSX, HTML or JSON Lines"""
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset, expected one of: {', '.join(DATASETS)}")
+    if export_format not in EXPORTERS:
+        raise HTTPException(status_code=404, detail=f"Unknown format, expected one of: {', '.join(EXPORTERS)}")
+    
+    source = DATASETS[dataset]
+    exporter = EXPORTERS[export_format]
+    filename = f"{dataset}_icd201_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{exporter.extension}"
+    
+    return StreamingResponse(
+        exporter.stream(source.title, source.columns(options), source.rows(db, options)),
+        media_type=exporter.media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @router.post("/preview")
 async def preview_export(options: PDFExportOptions):
     """Get preview of what will be included in PDF export"""
     try:
-        # Get course settings
-        settings = await db.course_settings.find_one()
-        if not settings:
-            raise HTTPException(status_code=404, detail="Course settings not found")
-        
-        # Get units
-        if options.selected_units:
-            units = await db.units.find({"id": {"$in": options.selected_units}}).to_list(1000)
-        else:
-            units = await db.units.find().to_list(1000)
+        # Get course data
+        try:
+            (settings, units, _, events), usage = await asyncio.gather(
+                load_course_data(
+                    options.copy(update={"include_resources": False}), PREVIEW_PROJECTIONS, require_units=False
+                ),
+                compute_resource_usage(db, unit_ids=options.selected_units)
+                if options.include_resources else asyncio.sleep(0, [])
+            )
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
         
         # Calculate totals
         total_hours = sum(unit.get("duration", 0) for unit in units)
@@ -81,23 +303,14 @@ async def preview_export(options: PDFExportOptions):
         # Get resource usage if needed
         resource_usage = []
         if options.include_resources:
-            resources = await db.resources.find().to_list(1000)
-            for resource in resources:
-                usage_hours = 0
-                for unit in units:
-                    for lesson in unit.get("lessons", []):
-                        if resource.get("id") in lesson.get("resources", []):
-                            usage_hours += lesson.get("duration", 0)
-                
-                resource_usage.append({
-                    "resource_name": resource.get("name"),
-                    "usage_hours": usage_hours
-                })
+            resource_usage = [
+                {"resource_name": entry["resource_name"], "usage_hours": entry["total_hours"]}
+                for entry in usage
+            ]
         
         # Get calendar summary if needed
         calendar_summary = {}
         if options.include_schedule:
-            events = await db.calendar_events.find().to_list(1000)
             calendar_summary = {
                 "total_events": len(events),
                 "scheduled_hours": sum(event.get("duration", 0) for event in events)
@@ -144,5 +357,7 @@ async def preview_export(options: PDFExportOptions):
         
         return preview
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating preview: {str(e)}")
\ No newline at end of file
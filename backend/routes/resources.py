@@ -1,24 +1,99 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
+from datetime import date, datetime
+import asyncio
+import orjson
+from pymongo.errors import DuplicateKeyError
 from models.resource import Resource, ResourceCreate, ResourceUpdate, ResourceUsage
 from utils.database import db, DatabaseManager
+from utils.single_flight import single_flight
+from services.occupancy_index import occupancy_index
+from services.resource_usage import resource_usage_view
+from services.heatmap import ResourceHeatmap, default_range
 
 router = APIRouter(prefix="/api/resources", tags=["resources"])
 
+# Longest range a heatmap may cover, about ten years
+MAX_HEATMAP_DAYS = 3660
+
 @router.get("/", response_model=List[Resource])
+@single_flight
 async def get_resources():
     """Get all resources"""
-    resources = await db.resources.find().to_list(1000)
-    return DatabaseManager.serialize_docs(resources)
+    resources = await DatabaseManager.cached_find("resources", {}, DatabaseManager.projection(Resource))
+    return ORJSONResponse([DatabaseManager.with_defaults(Resource, resource) for resource in resources])
+
+@router.get("/usage", response_model=List[ResourceUsage])
+@single_flight
+async def get_all_resource_usage():
+    """Get usage statistics for every resource"""
+    return ORJSONResponse(await resource_usage_view.all(db))
+
+@router.get("/heatmap")
+@single_flight
+async def get_resource_heatmap(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    granularity: str = Query("day", pattern="^(day|week)$"),
+    format: str = Query("json", pattern="^(json|npz)$")
+):
+    """Get booking demand against capacity for every resource and day or week"""
+    settings = await db.course_settings.find_one({}, {"_id": 0, "start_date": 1, "end_date": 1}) or {}
+    default_start, default_end = default_range(settings)
+    try:
+        start_date = date.fromisoformat(start) if start else default_start
+        end_date = date.fromisoformat(end) if end else default_end
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="End date is before start date")
+    if (end_date - start_date).days >= MAX_HEATMAP_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_HEATMAP_DAYS} days")
+    
+    resources = await db.resources.find({}, {"_id": 0, "id": 1, "name": 1, "quantity": 1}).sort("id", 1).to_list(None)
+    
+    if occupancy_index.ready:
+        slots, counts = occupancy_index.slot_counts()
+    else:
+        cursor = db.calendar_events.find(
+            {"date": {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()}},
+            {"_id": 0, "date": 1, "resources": 1}
+        )
+        slots = [
+            (resource_id, event.get("date"))
+            async for event in cursor
+            for resource_id in set(event.get("resources", []))
+        ]
+        counts = [1] * len(slots)
+    
+    # Building and encoding the matrix takes a while on long ranges, so it
+    # runs in a thread to keep the event loop free
+    body = await asyncio.to_thread(_render_heatmap, resources, start_date, end_date, granularity, format, slots, counts)
+    if format == "npz":
+        return Response(
+            body,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": "attachment; filename=resource_heatmap.npz"}
+        )
+    return Response(body, media_type="application/json")
+
+def _render_heatmap(resources: List[dict], start_date: date, end_date: date, granularity: str, format: str,
+                    slots: List[tuple], counts: List[int]) -> bytes:
+    heatmap = ResourceHeatmap(resources, start_date, end_date, granularity)
+    heatmap.add_bookings(slots, counts)
+    if format == "npz":
+        return heatmap.to_npz()
+    return orjson.dumps(heatmap.to_dict())
 
 @router.get("/{resource_id}", response_model=Resource)
+@single_flight
 async def get_resource(resource_id: str):
     """Get a specific resource by ID"""
-    resource = await db.resources.find_one({"id": resource_id})
+    resource = await db.resources.find_one({"id": resource_id}, DatabaseManager.projection(Resource))
     if not resource:
         raise HTTPException(status_code=404, detail="Resource not found")
-    return DatabaseManager.serialize_doc(resource)
+    return ORJSONResponse(DatabaseManager.with_defaults(Resource, resource))
 
 @router.post("/", response_model=Resource)
 async def create_resource(resource: ResourceCreate):
@@ -34,7 +109,12 @@ async def create_resource(resource: ResourceCreate):
         "updated_at": datetime.utcnow()
     })
     
-    result = await db.resources.insert_one(resource_dict)
+    try:
+        result = await db.resources.insert_one(resource_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Resource ID already exists")
+    await resource_usage_view.refresh(db, [resource.id])
+    DatabaseManager.notify_write("resources")
     created_resource = await db.resources.find_one({"_id": result.inserted_id})
     return DatabaseManager.serialize_doc(created_resource)
 
@@ -52,6 +132,8 @@ async def update_resource(resource_id: str, resource_update: ResourceUpdate):
         {"id": resource_id},
         {"$set": update_data}
     )
+    await resource_usage_view.refresh(db, [resource_id])
+    DatabaseManager.notify_write("resources")
     
     updated_resource = await db.resources.find_one({"id": resource_id})
     return DatabaseManager.serialize_doc(updated_resource)
@@ -63,55 +145,29 @@ async def delete_resource(resource_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Resource not found")
     
-    # Remove resource from all units/lessons and calendar events
+    # Remove resource from all units/lessons and calendar events, marking
+    # them as changed
+    now = datetime.utcnow()
     await db.units.update_many(
-        {},
-        {"$pull": {"lessons.$[].resources": resource_id}}
+        {"lessons.resources": resource_id},
+        {"$pull": {"lessons.$[].resources": resource_id}, "$set": {"updated_at": now}}
     )
     
     await db.calendar_events.update_many(
-        {},
-        {"$pull": {"resources": resource_id}}
+        {"resources": resource_id},
+        {"$pull": {"resources": resource_id}, "$set": {"updated_at": now}}
     )
+    occupancy_index.remove_resource(resource_id)
+    await resource_usage_view.refresh(db, [resource_id])
+    DatabaseManager.notify_write("resources", "units", "calendar_events")
     
     return {"message": "Resource deleted successfully"}
 
 @router.get("/{resource_id}/usage", response_model=ResourceUsage)
+@single_flight
 async def get_resource_usage(resource_id: str):
     """Get usage statistics for a resource"""
-    resource = await db.resources.find_one({"id": resource_id})
-    if not resource:
+    usage = await resource_usage_view.get(db, resource_id)
+    if not usage:
         raise HTTPException(status_code=404, detail="Resource not found")
-    
-    # Get all units
-    units = await db.units.find().to_list(1000)
-    
-    total_hours = 0
-    lessons_count = 0
-    units_using = []
-    
-    for unit in units:
-        unit_uses_resource = False
-        for lesson in unit.get("lessons", []):
-            if resource_id in lesson.get("resources", []):
-                total_hours += lesson.get("duration", 0)
-                lessons_count += 1
-                unit_uses_resource = True
-        
-        if unit_uses_resource:
-            units_using.append({
-                "unit_id": unit.get("id"),
-                "unit_title": unit.get("title")
-            })
-    
-    # Calculate utilization percentage (assuming 110 total course hours)
-    utilization_percentage = (total_hours / 110) * 100 if total_hours > 0 else 0
-    
-    return ResourceUsage(
-        resource_id=resource_id,
-        resource_name=resource.get("name", ""),
-        total_hours=total_hours,
-        lessons_count=lessons_count,
-        units_using=units_using,
-        utilization_percentage=round(utilization_percentage, 2)
-    )
\ No newline at end of file
+    return ORJSONResponse(usage)
\ No newline at end of file
@@ -1,14 +1,16 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
 from datetime import datetime
 from models.settings import CourseSettings, CourseSettingsUpdate
 from utils.database import db, DatabaseManager
+from services.resource_usage import resource_usage_view
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
 @router.get("/", response_model=CourseSettings)
 async def get_course_settings():
     """Get course settings"""
-    settings = await db.course_settings.find_one()
+    settings = await DatabaseManager.cached_find_one("course_settings", {}, DatabaseManager.projection(CourseSettings))
     if not settings:
         # Create default settings if none exist
         default_settings = {
@@ -23,9 +25,12 @@ async def get_course_settings():
             "updated_at": datetime.utcnow()
         }
         result = await db.course_settings.insert_one(default_settings)
-        settings = await db.course_settings.find_one({"_id": result.inserted_id})
+        DatabaseManager.notify_write("course_settings")
+        settings = await db.course_settings.find_one(
+            {"_id": result.inserted_id}, DatabaseManager.projection(CourseSettings)
+        )
     
-    return DatabaseManager.serialize_doc(settings)
+    return ORJSONResponse(DatabaseManager.with_defaults(CourseSettings, settings))
 
 @router.put("/", response_model=CourseSettings)
 async def update_course_settings(settings_update: CourseSettingsUpdate):
@@ -40,6 +45,10 @@ async def update_course_settings(settings_update: CourseSettingsUpdate):
             {"_id": existing_settings["_id"]},
             {"$set": update_data}
         )
+        if "total_hours" in update_data:
+            # Every utilization is relative to the course total
+            await resource_usage_view.rebuild(db)
+        DatabaseManager.notify_write("course_settings")
         updated_settings = await db.course_settings.find_one({"_id": existing_settings["_id"]})
     else:
         # Create new settings if none exist
@@ -56,6 +65,8 @@ async def update_course_settings(settings_update: CourseSettingsUpdate):
         }
         default_settings.update(update_data)
         result = await db.course_settings.insert_one(default_settings)
+        await resource_usage_view.rebuild(db)
+        DatabaseManager.notify_write("course_settings")
         updated_settings = await db.course_settings.find_one({"_id": result.inserted_id})
     
     return DatabaseManager.serialize_doc(updated_settings)
\ No newline at end of file
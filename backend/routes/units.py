@@ -1,31 +1,36 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
 from typing import List
 from datetime import datetime
 from models.unit import Unit, UnitCreate, UnitUpdate, Lesson, LessonCreate, LessonUpdate
 from utils.database import db, DatabaseManager
+from utils.single_flight import single_flight
+from services.occupancy_index import occupancy_index
+from services.resource_usage import resource_usage_view, lesson_resources
 
 router = APIRouter(prefix="/api/units", tags=["units"])
 
 @router.get("/", response_model=List[Unit])
+@single_flight
 async def get_units():
     """Get all course units"""
-    units = await db.units.find().to_list(1000)
-    return DatabaseManager.serialize_docs(units)
+    units = await DatabaseManager.cached_find("units", {}, DatabaseManager.projection(Unit))
+    return ORJSONResponse([DatabaseManager.with_defaults(Unit, unit) for unit in units])
 
 @router.get("/{unit_id}", response_model=Unit)
+@single_flight
 async def get_unit(unit_id: int):
     """Get a specific unit by ID"""
-    unit = await db.units.find_one({"id": unit_id})
+    unit = await db.units.find_one({"id": unit_id}, DatabaseManager.projection(Unit))
     if not unit:
         raise HTTPException(status_code=404, detail="Unit not found")
-    return DatabaseManager.serialize_doc(unit)
+    return ORJSONResponse(DatabaseManager.with_defaults(Unit, unit))
 
 @router.post("/", response_model=Unit)
 async def create_unit(unit: UnitCreate):
     """Create a new unit"""
     # Get the next unit ID
-    last_unit = await db.units.find_one(sort=[("id", -1)])
-    next_id = (last_unit["id"] + 1) if last_unit else 1
+    next_id = await DatabaseManager.reserve_ids("units")
     
     unit_dict = unit.dict()
     unit_dict.update({
@@ -36,6 +41,7 @@ async def create_unit(unit: UnitCreate):
     })
     
     result = await db.units.insert_one(unit_dict)
+    DatabaseManager.notify_write("units")
     created_unit = await db.units.find_one({"_id": result.inserted_id})
     return DatabaseManager.serialize_doc(created_unit)
 
@@ -54,6 +60,10 @@ async def update_unit(unit_id: int, unit_update: UnitUpdate):
         {"id": unit_id},
         {"$set": update_data}
     )
+    if "title" in update_data:
+        # Usage lists the titles of the units using each resource
+        await resource_usage_view.refresh(db, lesson_resources(existing_unit.get("lessons", [])))
+    DatabaseManager.notify_write("units")
     
     updated_unit = await db.units.find_one({"id": unit_id})
     return DatabaseManager.serialize_doc(updated_unit)
@@ -61,12 +71,15 @@ async def update_unit(unit_id: int, unit_update: UnitUpdate):
 @router.delete("/{unit_id}")
 async def delete_unit(unit_id: int):
     """Delete a unit"""
-    result = await db.units.delete_one({"id": unit_id})
-    if result.deleted_count == 0:
+    deleted_unit = await db.units.find_one_and_delete({"id": unit_id}, {"lessons.resources": 1})
+    if not deleted_unit:
         raise HTTPException(status_code=404, detail="Unit not found")
     
     # Also delete related calendar events
     await db.calendar_events.delete_many({"unit_id": unit_id})
+    occupancy_index.remove_unit(unit_id)
+    await resource_usage_view.refresh(db, lesson_resources(deleted_unit.get("lessons", [])))
+    DatabaseManager.notify_write("units", "calendar_events")
     
     return {"message": "Unit deleted successfully"}
 
@@ -78,8 +91,7 @@ async def add_lesson(unit_id: int, lesson: LessonCreate):
         raise HTTPException(status_code=404, detail="Unit not found")
     
     # Get next lesson ID
-    existing_lessons = unit.get("lessons", [])
-    next_lesson_id = max([l.get("id", 0) for l in existing_lessons], default=0) + 1
+    next_lesson_id = await DatabaseManager.reserve_ids("lessons")
     
     lesson_dict = lesson.dict()
     lesson_dict["id"] = next_lesson_id
@@ -91,6 +103,8 @@ async def add_lesson(unit_id: int, lesson: LessonCreate):
             "$set": {"updated_at": datetime.utcnow()}
         }
     )
+    await resource_usage_view.refresh(db, lesson_resources([lesson_dict]))
+    DatabaseManager.notify_write("units")
     
     updated_unit = await db.units.find_one({"id": unit_id})
     return DatabaseManager.serialize_doc(updated_unit)
@@ -123,6 +137,8 @@ async def update_lesson(unit_id: int, lesson_id: int, lesson_update: LessonUpdat
         {"id": unit_id, "lessons.id": lesson_id},
         {"$set": set_fields}
     )
+    await resource_usage_view.refresh(db, lesson_resources([lessons[lesson_index], update_data]))
+    DatabaseManager.notify_write("units")
     
     updated_unit = await db.units.find_one({"id": unit_id})
     return DatabaseManager.serialize_doc(updated_unit)
@@ -144,6 +160,11 @@ async def delete_lesson(unit_id: int, lesson_id: int):
     
     # Also delete related calendar events
     await db.calendar_events.delete_many({"unit_id": unit_id, "lesson_id": lesson_id})
+    occupancy_index.remove_lesson(unit_id, lesson_id)
+    await resource_usage_view.refresh(
+        db, lesson_resources(lesson for lesson in unit.get("lessons", []) if lesson.get("id") == lesson_id)
+    )
+    DatabaseManager.notify_write("units", "calendar_events")
     
     updated_unit = await db.units.find_one({"id": unit_id})
     return DatabaseManager.serialize_doc(updated_unit)
\ No newline at end of file
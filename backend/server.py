@@ -14,11 +14,12 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Initialize database first
-from utils.database import init_database, DatabaseManager, db
+from utils.database import init_database, DatabaseManager, db, read_cache, QUERY_PLAN_CHECK
 init_database()
 
 # Import route modules after database initialization
-from routes import units, resources, calendar, settings, export
+from routes import units, resources, calendar, settings, export, course
+from utils.conditional import ConditionalGetMiddleware
 
 # Create the main app without a prefix
 app = FastAPI(
@@ -56,6 +57,17 @@ async def get_status_checks():
     status_checks = await db.status_checks.find().to_list(1000)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
+@api_router.get("/metrics")
+async def get_metrics():
+    """Cache counters for monitoring"""
+    from services.change_watcher import change_watcher
+    from utils.single_flight import flight_stats
+    return {
+        "read_cache": read_cache.stats(),
+        "change_watcher": change_watcher.stats(),
+        "single_flight": flight_stats
+    }
+
 # Include all routers
 app.include_router(api_router)
 app.include_router(units.router)
@@ -63,6 +75,9 @@ app.include_router(resources.router)
 app.include_router(calendar.router)
 app.include_router(settings.router)
 app.include_router(export.router)
+app.include_router(course.router)
+
+app.add_middleware(ConditionalGetMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -70,6 +85,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Configure logging
@@ -79,18 +95,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _run_startup_step(done_message: str, step, *args):
+    """Run an optional startup step, logging instead of stopping startup when it fails"""
+    try:
+        await step(*args)
+        logger.info(done_message)
+    except Exception as e:
+        logger.error(f"Startup step {step.__qualname__} failed: {e}")
+
 @app.on_event("startup")
 async def startup_db_client():
     """Initialize database with default data on startup"""
-    try:
-        from utils.database import DatabaseManager
-        await DatabaseManager.init_default_data()
-        logger.info("Database initialized successfully")
-    except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+    from utils.database import db
+    from services.occupancy_index import occupancy_index
+    from services.resource_usage import resource_usage_view
+    from services.change_watcher import change_watcher
+    from services.export_jobs import export_job_worker
+    from services.pdf_pool import pdf_render_pool
+    
+    # Counters are seeded before the indexes are built, so IDs never collide
+    # with stored ones even when an index fails. A unique index blocked by
+    # duplicate keys stops startup with the duplicates listed.
+    await DatabaseManager.init_default_data()
+    await DatabaseManager.seed_counters()
+    await DatabaseManager.ensure_indexes()
+    logger.info("Database initialized successfully")
+    
+    # Checked before any background work starts, so a failure leaves nothing running
+    if QUERY_PLAN_CHECK == "warn":
+        await _run_startup_step("Query plans verified", DatabaseManager.verify_query_plans)
+    else:
+        await DatabaseManager.verify_query_plans()
+        logger.info("Query plans verified")
+    
+    await _run_startup_step("Resource occupancy index built", occupancy_index.rebuild, db)
+    await _run_startup_step("Resource usage view rebuilt", resource_usage_view.rebuild, db)
+    await _run_startup_step("Change watcher started", change_watcher.start, db)
+    await _run_startup_step("Export job worker started", export_job_worker.start)
+    await _run_startup_step("PDF render workers ready", pdf_render_pool.warm_up)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     from utils.database import client
     if client:
         client.close()
+    
+    from services.change_watcher import change_watcher
+    await change_watcher.stop()
+    
+    from services.export_jobs import export_job_worker
+    await export_job_worker.stop()
+    
+    from services.pdf_pool import pdf_render_pool
+    pdf_render_pool.shutdown()
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+from utils.database import DatabaseManager
+from services.occupancy_index import occupancy_index
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ("units", "resources", "calendar_events", "course_settings")
+
+class ChangeWatcher:
+    """Keeps the in-process caches of this worker coherent with writes made by others.
+
+    Tails a change stream on the watched collections and, for each change,
+    bumps the collection versions and runs the write listeners through
+    DatabaseManager.notify_write, so the read cache and the PDF cache drop
+    what they hold. Calendar changes are applied to the occupancy index one
+    by one: the stream looks up the full document of inserts and updates,
+    and deletes are matched by _id. A change the index already holds, such
+    as a write made by this worker, is skipped. The index is only rebuilt
+    when changes were missed, such as while polling, or when the collection
+    is dropped; rebuilds requested while one runs are folded into a single
+    next one. The resource_usage view lives in Mongo and is refreshed by the
+    worker that wrote, so it needs nothing here.
+
+    Change streams need a replica set. When one cannot be opened, such as on
+    a standalone mongod, the watcher polls the newest updated_at and the
+    document count of each collection instead, and tries the change stream
+    again every retry_interval seconds.
+    """
+
+    def __init__(self):
+        self.poll_interval = float(os.environ.get("CHANGE_POLL_INTERVAL", "1"))
+        self.retry_interval = float(os.environ.get("CHANGE_STREAM_RETRY", "60"))
+        self.mode: Optional[str] = None
+        self.invalidations = 0
+        self.applied = 0
+        self.skipped = 0
+        self._db = None
+        self._task = None
+        self._rebuild_task = None
+        self._rebuild_again = False
+        self._resume_token = None
+        self._signatures_seen = None
+
+    async def start(self, db):
+        """Start watching in the background"""
+        self._db = db
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        for task in (self._task, self._rebuild_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._rebuild_task = None
+        self._resume_token = None
+        self._signatures_seen = None
+        self.mode = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring"""
+        return {
+            "mode": self.mode,
+            "invalidations": self.invalidations,
+            "index_changes_applied": self.applied,
+            "index_changes_skipped": self.skipped
+        }
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, OperationFailure):
+                    # Not a replica set, or the resume token fell out of the oplog
+                    self._resume_token = None
+                if self.mode != "polling":
+                    logger.warning(f"Change stream unavailable, polling updated_at instead: {e}")
+                await self._poll(self.retry_interval)
+
+    async def _watch(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        async with self._db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token) as stream:
+            if self.mode is not None and self._resume_token is None:
+                # Changes made while switching over were not seen
+                self.invalidate(WATCHED_COLLECTIONS)
+            if self.mode != "change_stream":
+                logger.info("Watching collection changes with a change stream")
+            self.mode = "change_stream"
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                self.apply(change)
+
+    async def _poll(self, duration: float):
+        """Poll for changes during duration seconds"""
+        if self.mode != "polling" or self._signatures_seen is None:
+            self._signatures_seen = await self._signatures()
+            if self.mode is not None:
+                # Changes made while switching over were not seen
+                self.invalidate(WATCHED_COLLECTIONS)
+        self.mode = "polling"
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        while loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            current = await self._signatures()
+            changed = {
+                collection for collection in WATCHED_COLLECTIONS
+                if current[collection] != self._signatures_seen[collection]
+            }
+            if changed:
+                self.invalidate(sorted(changed))
+            self._signatures_seen = current
+
+    async def _signatures(self) -> Dict[str, Tuple[Any, int]]:
+        """Newest updated_at and document count of each watched collection"""
+        results = await asyncio.gather(*[
+            query
+            for collection in WATCHED_COLLECTIONS
+            for query in (
+                self._db[collection].find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)]),
+                self._db[collection].estimated_document_count()
+            )
+        ])
+        return {
+            collection: ((newest or {}).get("updated_at"), count)
+            for collection, newest, count in zip(WATCHED_COLLECTIONS, results[::2], results[1::2])
+        }
+
+    def apply(self, change: Dict[str, Any]):
+        """Bring the local state up to date with one change stream event"""
+        collection = change.get("ns", {}).get("coll")
+        if collection is None:
+            # The database was dropped or the stream invalidated
+            self.invalidate(WATCHED_COLLECTIONS)
+            return
+
+        self.invalidations += 1
+        DatabaseManager.notify_write(collection)
+        if collection != "calendar_events":
+            return
+
+        operation = change.get("operationType")
+        if operation not in ("insert", "update", "replace", "delete") or self._rebuilding():
+            # A rebuild reading the calendar may have missed this change
+            self._schedule_index_rebuild()
+        elif operation == "delete":
+            if occupancy_index.remove_document(change["documentKey"]["_id"]):
+                self.applied += 1
+            else:
+                self.skipped += 1
+        else:
+            # The document is looked up after the change, so it is missing
+            # when it has been deleted since; its delete change follows
+            event = change.get("fullDocument")
+            if event is None or occupancy_index.holds(event):
+                self.skipped += 1
+            else:
+                occupancy_index.add_event(event)
+                self.applied += 1
+
+    def invalidate(self, collections: Iterable[str]):
+        """Drop the local state derived from collections, without knowing what changed in them"""
+        collections = tuple(collections)
+        self.invalidations += 1
+        DatabaseManager.notify_write(*collections)
+        if "calendar_events" in collections:
+            self._schedule_index_rebuild()
+
+    def _rebuilding(self) -> bool:
+        return self._rebuild_task is not None and not self._rebuild_task.done()
+
+    def _schedule_index_rebuild(self):
+        if self._rebuilding():
+            self._rebuild_again = True
+            return
+        self._rebuild_task = asyncio.create_task(self._rebuild_index())
+
+    async def _rebuild_index(self):
+        self._rebuild_again = True
+        while self._rebuild_again:
+            self._rebuild_again = False
+            try:
+                await occupancy_index.rebuild(self._db)
+            except Exception as e:
+                logger.error(f"Occupancy index rebuild failed: {e}")
+                return
+
+change_watcher = ChangeWatcher()
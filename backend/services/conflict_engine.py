@@ -0,0 +1,74 @@
+from itertools import groupby
+from operator import itemgetter
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+class ConflictEngine:
+    """Detect resource over-subscription against each resource's quantity.
+
+    Every event holds one unit of each resource it lists for the whole day of
+    its date. A resource is in conflict on a day when the events booking it
+    outnumber its quantity.
+    """
+
+    def __init__(self, resources: Iterable[Dict[str, Any]]):
+        self.capacities = {
+            resource.get("id"): resource for resource in resources
+        }
+
+    @classmethod
+    async def load(cls, db, resource_ids: Optional[List[str]] = None) -> "ConflictEngine":
+        """Create an engine with the quantity of every resource, in one query"""
+        filter_query = {"id": {"$in": resource_ids}} if resource_ids is not None else {}
+        resources = await db.resources.find(
+            filter_query, {"_id": 0, "id": 1, "name": 1, "quantity": 1}
+        ).to_list(None)
+        return cls(resources)
+
+    def capacity(self, resource_id: str) -> int:
+        """Number of concurrent bookings a resource supports"""
+        resource = self.capacities.get(resource_id)
+        if resource is None or resource.get("quantity") is None:
+            # Unknown resources cannot be shared
+            return 1
+        return resource["quantity"]
+
+    def resource_name(self, resource_id: str) -> str:
+        resource = self.capacities.get(resource_id)
+        return resource.get("name", "") if resource else resource_id
+
+    def build_conflict(self, date: str, resource_id: str, events: List[Dict]) -> Dict[str, Any]:
+        """Describe an over-subscribed resource on a given day"""
+        return {
+            "date": date,
+            "resource_id": resource_id,
+            "resource_name": self.resource_name(resource_id),
+            "capacity": self.capacity(resource_id),
+            "peak_demand": len(events),
+            "conflict_count": len(events),
+            "events": events
+        }
+
+    def detect(self, events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Sweep events sorted by (date, resource) and report over-subscription"""
+        demand: List[Tuple[str, str, int, Dict]] = []
+        for position, event in enumerate(events):
+            date = event.get("date")
+            if date is None:
+                continue
+            for resource_id in set(event.get("resources", [])):
+                demand.append((date, resource_id, position, event))
+
+        demand.sort(key=itemgetter(0, 1, 2))
+
+        conflicts = []
+        for (date, resource_id), bookings in groupby(demand, key=itemgetter(0, 1)):
+            day_events = [booking[3] for booking in bookings]
+            if len(day_events) > self.capacity(resource_id):
+                conflicts.append(self.build_conflict(date, resource_id, day_events))
+
+        return conflicts
+
+    async def detect_in_db(self, db) -> List[Dict[str, Any]]:
+        """Stream every calendar event from the database and detect conflicts"""
+        cursor = db.calendar_events.find({}, {"_id": 0}).sort("date", 1)
+        return self.detect([event async for event in cursor])
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Dict, List, NamedTuple
+
+from models.settings import PDFExportOptions
+from utils.database import db, DatabaseManager
+
+# Fields read by the PDF generator, per collection
+PDF_PROJECTIONS = {
+    "course_settings": {
+        "_id": 0, "course_title": 1, "course_description": 1, "start_date": 1, "end_date": 1,
+        "total_hours": 1, "total_weeks": 1, "hours_per_week": 1
+    },
+    "units": {
+        "_id": 0, "id": 1, "title": 1, "description": 1, "duration": 1,
+        "objectives": 1, "lessons": 1, "updated_at": 1
+    },
+    "resources": {"_id": 0, "id": 1, "name": 1, "quantity": 1, "description": 1, "availability": 1},
+    "calendar_events": {"_id": 0, "id": 1, "date": 1, "title": 1, "duration": 1, "unit_id": 1, "resources": 1}
+}
+
+# Fields read by the export preview, per collection
+PREVIEW_PROJECTIONS = {
+    "course_settings": {"_id": 0, "course_title": 1, "course_description": 1, "total_hours": 1, "total_weeks": 1},
+    "units": {
+        "_id": 0, "id": 1, "title": 1, "duration": 1, "objectives": 1, "lessons.id": 1
+    },
+    "resources": {"_id": 0, "id": 1, "name": 1},
+    "calendar_events": {"_id": 0, "duration": 1}
+}
+
+class CourseData(NamedTuple):
+    """Serialized documents an export is built from"""
+    settings: Dict[str, Any]
+    units: List[Dict[str, Any]]
+    resources: List[Dict[str, Any]]
+    events: List[Dict[str, Any]]
+
+async def load_course_data(options: PDFExportOptions, projections: Dict[str, Dict] = PDF_PROJECTIONS,
+                           require_units: bool = True) -> CourseData:
+    """Load the documents an export needs with concurrent queries.
+
+    Resources and events are only read when the options include them, and
+    only the fields in projections are fetched. Raises LookupError when the
+    course settings, or the units if require_units is set, are missing.
+    """
+    unit_filter = {"id": {"$in": options.selected_units}} if options.selected_units else {}
+
+    settings, units, resources, events = await asyncio.gather(
+        db.course_settings.find_one({}, projections["course_settings"]),
+        db.units.find(unit_filter, projections["units"]).to_list(None),
+        db.resources.find({}, projections["resources"]).to_list(None) if options.include_resources else _no_documents(),
+        db.calendar_events.find({}, projections["calendar_events"]).sort("date", 1).to_list(None)
+        if options.include_schedule else _no_documents()
+    )
+
+    if not settings:
+        raise LookupError("Course settings not found")
+    if require_units and not units:
+        raise LookupError("No units found")
+
+    return CourseData(
+        settings=DatabaseManager.serialize_doc(settings),
+        units=DatabaseManager.serialize_docs(units),
+        resources=DatabaseManager.serialize_docs(resources),
+        events=DatabaseManager.serialize_docs(events)
+    )
+
+async def _no_documents() -> List[Dict[str, Any]]:
+    return []
@@ -0,0 +1,91 @@
+import abc
+from typing import Any, AsyncIterator, Dict, List
+
+from models.settings import PDFExportOptions
+from services.resource_usage import compute_resource_usage
+
+def _unit_filter(options: PDFExportOptions, field: str = "id") -> Dict:
+    if options.selected_units:
+        return {field: {"$in": options.selected_units}}
+    return {}
+
+class ExportDataset(abc.ABC):
+    """Rows of one table offered by the tabular exports.
+
+    rows() reads straight from a Mongo cursor and honors the unit selection
+    and the detail options of PDFExportOptions; the section switches
+    (include_lessons, include_resources, include_schedule) only apply to the
+    PDF, since a tabular export asks for one dataset explicitly.
+    """
+
+    title = ""
+
+    @abc.abstractmethod
+    def columns(self, options: PDFExportOptions) -> List[str]:
+        """Columns of the table, in order"""
+
+    @abc.abstractmethod
+    async def rows(self, db, options: PDFExportOptions) -> AsyncIterator[Dict[str, Any]]:
+        """Rows of the table, dicts keyed by column"""
+
+class UnitsDataset(ExportDataset):
+    title = "Unités"
+
+    def columns(self, options):
+        columns = ["id", "title", "description", "duration", "lessons_count"]
+        if options.include_objectives:
+            columns.append("objectives")
+        return columns + ["updated_at"]
+
+    async def rows(self, db, options):
+        cursor = db.units.find(_unit_filter(options), {"_id": 0}).sort("id", 1)
+        async for unit in cursor:
+            unit["lessons_count"] = len(unit.get("lessons", []))
+            yield unit
+
+class LessonsDataset(ExportDataset):
+    title = "Leçons"
+
+    def columns(self, options):
+        columns = ["unit_id", "unit_title", "id", "title", "duration", "resources"]
+        if options.include_activities:
+            columns.append("activities")
+        if options.detail_level == "detailed":
+            columns.append("content")
+        return columns
+
+    async def rows(self, db, options):
+        cursor = db.units.find(_unit_filter(options), {"_id": 0, "id": 1, "title": 1, "lessons": 1}).sort("id", 1)
+        async for unit in cursor:
+            for lesson in unit.get("lessons", []):
+                yield dict(lesson, unit_id=unit.get("id"), unit_title=unit.get("title"))
+
+class ResourceUsageDataset(ExportDataset):
+    title = "Utilisation des ressources"
+
+    def columns(self, options):
+        return ["resource_id", "resource_name", "total_hours", "lessons_count",
+                "units_using", "utilization_percentage"]
+
+    async def rows(self, db, options):
+        for usage in await compute_resource_usage(db, unit_ids=options.selected_units):
+            usage["units_using"] = [unit["unit_id"] for unit in usage["units_using"]]
+            yield usage
+
+class CalendarEventsDataset(ExportDataset):
+    title = "Calendrier"
+
+    def columns(self, options):
+        return ["id", "date", "title", "unit_id", "lesson_id", "duration", "resources"]
+
+    async def rows(self, db, options):
+        cursor = db.calendar_events.find(_unit_filter(options, "unit_id"), {"_id": 0}).sort([("date", 1), ("id", 1)])
+        async for event in cursor:
+            yield event
+
+DATASETS: Dict[str, ExportDataset] = {
+    "units": UnitsDataset(),
+    "lessons": LessonsDataset(),
+    "resource_usage": ResourceUsageDataset(),
+    "calendar_events": CalendarEventsDataset()
+}
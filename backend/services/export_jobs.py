@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from queue import Empty
+from typing import BinaryIO, Dict, Any, Optional
+
+from pymongo import ReturnDocument
+
+from models.settings import PDFExportOptions
+from utils.database import db
+from services.pdf_pool import pdf_render_pool, RenderPoolSaturated
+from services.pdf_cache import PDFCache, pdf_cache
+from services.course_data import load_course_data
+
+logger = logging.getLogger(__name__)
+
+# Fields of a job document returned by the API
+JOB_PROJECTION = {"_id": 0, "worker": 0, "heartbeat": 0}
+
+class ExportJobWorker:
+    """In-process worker rendering PDF export jobs queued in Mongo.
+
+    Job state lives in the export_jobs collection, so a job claimed by a
+    worker that stops heartbeating goes back to the queue and is picked up
+    again after a restart. Finished PDFs are stored on local disk and
+    removed, with their job, once they expire.
+    """
+
+    def __init__(self):
+        default_dir = os.path.join(tempfile.gettempdir(), "icd201_exports")
+        self.artifact_dir = Path(os.environ.get("EXPORT_ARTIFACT_DIR", default_dir))
+        self.artifact_ttl = timedelta(seconds=int(os.environ.get("EXPORT_ARTIFACT_TTL", "86400")))
+        self.job_timeout = float(os.environ.get("EXPORT_JOB_TIMEOUT", "900"))
+        self.poll_interval = float(os.environ.get("EXPORT_JOB_POLL_INTERVAL", "2"))
+        self.stale_after = timedelta(seconds=int(os.environ.get("EXPORT_JOB_STALE_AFTER", "60")))
+        self.worker_id = uuid.uuid4().hex
+        self._task = None
+        self._wakeup = None
+        self._manager = None
+
+    async def start(self):
+        """Start processing queued jobs in the background"""
+        self.artifact_dir.mkdir(parents=True, exist_ok=True)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    async def enqueue(self, options: PDFExportOptions) -> Dict[str, Any]:
+        """Queue a PDF export and return the new job"""
+        now = datetime.utcnow()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "options": options.dict(),
+            "progress": {"section": None, "completed": 0, "total": 0},
+            "error": None,
+            "file_name": f"schema_cours_icd201_{now.strftime('%Y%m%d_%H%M%S')}.pdf",
+            "size": None,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "expires_at": None
+        }
+        await db.export_jobs.insert_one(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job["id"])
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await db.export_jobs.find_one({"id": job_id}, JOB_PROJECTION)
+
+    def artifact_path(self, job_id: str) -> Path:
+        return self.artifact_dir / f"{job_id}.pdf"
+
+    async def _run_forever(self):
+        last_maintenance = None
+        while True:
+            try:
+                now = datetime.utcnow()
+                if last_maintenance is None or now - last_maintenance > self.stale_after / 2:
+                    await self._requeue_stale()
+                    await self._remove_expired()
+                    last_maintenance = now
+
+                job = await self._claim()
+                if job is not None:
+                    await self._process(job)
+                    continue
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Export job worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job"""
+        now = datetime.utcnow()
+        return await db.export_jobs.find_one_and_update(
+            {"status": "queued"},
+            {"$set": {
+                "status": "running",
+                "worker": self.worker_id,
+                "heartbeat": now,
+                "started_at": now,
+                "updated_at": now
+            }},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _requeue_stale(self):
+        """Give jobs of workers that stopped heartbeating back to the queue"""
+        result = await db.export_jobs.update_many(
+            {"status": "running", "heartbeat": {"$lt": datetime.utcnow() - self.stale_after}},
+            {"$set": {"status": "queued", "worker": None, "updated_at": datetime.utcnow()}}
+        )
+        if result.modified_count:
+            logger.info(f"Requeued {result.modified_count} interrupted export jobs")
+
+    async def _remove_expired(self):
+        """Delete expired jobs and their files"""
+        expired = await db.export_jobs.find(
+            {"expires_at": {"$lt": datetime.utcnow()}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        for job in expired:
+            self.artifact_path(job["id"]).unlink(missing_ok=True)
+        if expired:
+            await db.export_jobs.delete_many({"id": {"$in": [job["id"] for job in expired]}})
+
+    async def _process(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        path = self.artifact_path(job_id)
+        heartbeat = None
+        try:
+            options = PDFExportOptions(**job["options"])
+            settings, units, resources, events = await load_course_data(options)
+
+            cache_key = PDFCache.key(settings, units, resources, events, options)
+            cached = pdf_cache.get(cache_key)
+            if isinstance(cached, bytes):
+                await asyncio.to_thread(path.write_bytes, cached)
+                size = len(cached)
+                completed = 1
+            elif cached is not None:
+                size = await asyncio.to_thread(_copy_to, cached, path)
+                completed = 1
+            else:
+                progress_queue = self._get_manager().Queue()
+                heartbeat = asyncio.create_task(self._report_progress(job_id, progress_queue))
+                size = await self._render(path, settings, units, resources, events, options, progress_queue)
+                await _cancel(heartbeat)
+                latest = await asyncio.to_thread(_drain, progress_queue)
+                completed = latest[2] if latest else 1
+
+            now = datetime.utcnow()
+            await db.export_jobs.update_one(
+                {"id": job_id, "worker": self.worker_id},
+                {"$set": {
+                    "status": "done",
+                    "size": size,
+                    "progress": {"section": None, "completed": completed, "total": completed},
+                    "finished_at": now,
+                    "updated_at": now,
+                    "expires_at": now + self.artifact_ttl
+                }}
+            )
+        except Exception as e:
+            if heartbeat is not None:
+                await _cancel(heartbeat)
+            path.unlink(missing_ok=True)
+            now = datetime.utcnow()
+            error = "Export timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            await db.export_jobs.update_one(
+                {"id": job_id, "worker": self.worker_id},
+                {"$set": {
+                    "status": "failed",
+                    "error": error,
+                    "finished_at": now,
+                    "updated_at": now,
+                    "expires_at": now + self.artifact_ttl
+                }}
+            )
+
+    async def _render(self, path: Path, settings, units, resources, events, options, progress_queue) -> int:
+        """Render in the shared pool, waiting for a slot rather than failing"""
+        while True:
+            try:
+                return await pdf_render_pool.render_to_file(
+                    str(path), settings, units, resources, events, options,
+                    progress_queue=progress_queue, timeout=self.job_timeout
+                )
+            except RenderPoolSaturated as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _report_progress(self, job_id: str, progress_queue):
+        """Store the latest section reported by the render and keep the job alive"""
+        heartbeat_interval = min(self.stale_after.total_seconds() / 4, 1.0)
+        while True:
+            latest = await asyncio.to_thread(_drain, progress_queue)
+            update = {"heartbeat": datetime.utcnow(), "updated_at": datetime.utcnow()}
+            if latest is not None:
+                section, completed, total = latest
+                update["progress"] = {"section": section, "completed": completed, "total": total}
+            await db.export_jobs.update_one({"id": job_id, "worker": self.worker_id}, {"$set": update})
+            await asyncio.sleep(heartbeat_interval)
+
+    def _get_manager(self):
+        # Queues shared with the spawned render processes
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+async def _cancel(task: asyncio.Task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+def _drain(progress_queue):
+    """Latest progress message waiting in a queue, if any"""
+    latest = None
+    while True:
+        try:
+            latest = progress_queue.get_nowait()
+        except Empty:
+            return latest
+
+def _copy_to(pdf_file: BinaryIO, path: Path) -> int:
+    """Copy an open cached PDF to a job artifact, returning its size"""
+    with pdf_file, open(path, "wb") as artifact:
+        shutil.copyfileobj(pdf_file, artifact)
+        return artifact.tell()
+
+export_job_worker = ExportJobWorker()
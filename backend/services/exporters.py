@@ -0,0 +1,219 @@
+import abc
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from html import escape
+from typing import Any, AsyncIterator, Dict, List
+from xml.sax.saxutils import escape as xml_escape
+
+import orjson
+
+# Size of the pieces an export is streamed in
+CHUNK_SIZE = 64 * 1024
+
+# Characters XML 1.0 does not allow, even escaped
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def cell_text(value: Any) -> str:
+    """Plain text of a value in a tabular export"""
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(cell_text(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class StreamSink:
+    """Write-only file object whose content is drained by a generator.
+
+    Lets zipfile and csv write into memory that is handed to the response
+    chunk by chunk instead of building the whole file.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+class TabularExporter(abc.ABC):
+    """Streaming export of rows to one file format.
+
+    stream() consumes rows, dicts keyed by column, from an async iterator and
+    yields the encoded file in chunks of about CHUNK_SIZE bytes, so memory
+    does not grow with the number of rows. Register new formats in EXPORTERS.
+    """
+
+    media_type = "application/octet-stream"
+    extension = "bin"
+
+    @abc.abstractmethod
+    async def stream(self, title: str, columns: List[str],
+                     rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+        """Encoded file, in chunks"""
+
+class CSVExporter(TabularExporter):
+    media_type = "text/csv; charset=utf-8"
+    extension = "csv"
+
+    async def stream(self, title, columns, rows):
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        async for row in rows:
+            writer.writerow([cell_text(row.get(column)) for column in columns])
+            if text.tell() >= CHUNK_SIZE:
+                yield text.getvalue().encode("utf-8")
+                text.seek(0)
+                text.truncate()
+        yield text.getvalue().encode("utf-8")
+
+class JSONLinesExporter(TabularExporter):
+    media_type = "application/x-ndjson"
+    extension = "jsonl"
+
+    async def stream(self, title, columns, rows):
+        buffer = bytearray()
+        async for row in rows:
+            buffer += orjson.dumps({column: row.get(column) for column in columns}, default=str)
+            buffer += b"\n"
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        yield bytes(buffer)
+
+class HTMLExporter(TabularExporter):
+    media_type = "text/html; charset=utf-8"
+    extension = "html"
+
+    async def stream(self, title, columns, rows):
+        head = "".join(f"<th>{escape(column)}</th>" for column in columns)
+        parts = [
+            "<!DOCTYPE html>\n<html lang=\"fr\">\n<head>\n<meta charset=\"utf-8\">\n",
+            f"<title>{escape(title)}</title>\n",
+            "<style>body{font-family:sans-serif;margin:2em}"
+            "table{border-collapse:collapse}"
+            "th,td{border:1px solid #ccc;padding:4px 8px;text-align:left;vertical-align:top}"
+            "th{background:#eee}</style>\n",
+            f"</head>\n<body>\n<h1>{escape(title)}</h1>\n<table>\n<thead><tr>{head}</tr></thead>\n<tbody>\n"
+        ]
+        size = sum(map(len, parts))
+        async for row in rows:
+            cells = "".join(f"<td>{escape(cell_text(row.get(column)))}</td>" for column in columns)
+            parts.append(f"<tr>{cells}</tr>\n")
+            size += len(parts[-1])
+            if size >= CHUNK_SIZE:
+                yield "".join(parts).encode("utf-8")
+                parts.clear()
+                size = 0
+        parts.append("</tbody>\n</table>\n</body>\n</html>\n")
+        yield "".join(parts).encode("utf-8")
+
+class XLSXExporter(TabularExporter):
+    """Single-sheet workbook written as the rows arrive.
+
+    Cells are inline strings or numbers, so the package needs no shared
+    string table and each row can be compressed into the ZIP at once.
+    """
+
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    extension = "xlsx"
+
+    CONTENT_TYPES = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    )
+    ROOT_RELS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    )
+    WORKBOOK_RELS = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    )
+
+    async def stream(self, title, columns, rows):
+        sink = StreamSink()
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as package:
+            package.writestr("[Content_Types].xml", self.CONTENT_TYPES)
+            package.writestr("_rels/.rels", self.ROOT_RELS)
+            package.writestr("xl/workbook.xml", self._workbook(title))
+            package.writestr("xl/_rels/workbook.xml.rels", self.WORKBOOK_RELS)
+
+            with package.open("xl/worksheets/sheet1.xml", "w") as sheet:
+                sheet.write(
+                    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                    b'<sheetData>'
+                )
+                sheet.write(self._row(1, columns))
+                row_number = 1
+                async for row in rows:
+                    row_number += 1
+                    sheet.write(self._row(row_number, [row.get(column) for column in columns]))
+                    if len(sink) >= CHUNK_SIZE:
+                        yield sink.drain()
+                sheet.write(b"</sheetData></worksheet>")
+        yield sink.drain()
+
+    @staticmethod
+    def _workbook(title: str) -> str:
+        # Sheet names are limited to 31 characters and cannot contain []:*?/\
+        sheet_name = re.sub(r"[\[\]:*?/\\]", " ", title)[:31] or "Feuille1"
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{xml_escape(sheet_name, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        )
+
+    @staticmethod
+    def _row(number: int, values: List[Any]) -> bytes:
+        cells = []
+        for value in values:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                cells.append(f"<c><v>{value}</v></c>")
+            else:
+                text = xml_escape(_XML_ILLEGAL.sub("", cell_text(value)))
+                cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        return f'<row r="{number}">{"".join(cells)}</row>'.encode("utf-8")
+
+EXPORTERS: Dict[str, TabularExporter] = {
+    "csv": CSVExporter(),
+    "xlsx": XLSXExporter(),
+    "html": HTMLExporter(),
+    "jsonl": JSONLinesExporter()
+}
@@ -0,0 +1,159 @@
+import io
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.conflict_engine import ConflictEngine
+
+class ResourceHeatmap:
+    """Dense resources x periods matrix of booking demand against capacity.
+
+    Demand follows the conflict engine: every event holds one unit of each
+    resource it lists for the whole day. Weekly periods, counted from the
+    start date, hold the peak daily demand of the week so they compare with
+    capacity the same way days do.
+    """
+
+    def __init__(self, resources: List[Dict[str, Any]], start: date, end: date, granularity: str = "day"):
+        engine = ConflictEngine(resources)
+        self.resources = resources
+        self.resource_ids = [resource["id"] for resource in resources]
+        self.start = start
+        self.end = end
+        self.granularity = granularity
+        self.days = (end - start).days + 1
+        self.capacity = np.array([engine.capacity(rid) for rid in self.resource_ids], dtype=np.int32)
+        self.demand = np.zeros((len(resources), self.days), dtype=np.int32)
+
+    def add_bookings(self, slots: Sequence[Tuple[str, Optional[str]]], counts: Sequence[int]):
+        """Accumulate the counts of booked (resource_id, date) slots with one np.add.at.
+
+        Rows come from a binary search of the resource ids and columns from
+        parsing every date at once, so no Python code runs per booking
+        beyond splitting the pairs. Bookings of unknown resources, outside
+        the range or with malformed dates are ignored.
+        """
+        if not slots or not self.resource_ids:
+            return
+
+        resource_ids = np.array([resource_id for resource_id, _ in slots], dtype=str)
+        order = np.argsort(np.array(self.resource_ids, dtype=str))
+        known = np.array(self.resource_ids, dtype=str)[order]
+        positions = np.minimum(np.searchsorted(known, resource_ids), len(known) - 1)
+        rows = order[positions]
+
+        days = _parse_days([day for _, day in slots])
+        columns = (days - np.datetime64(self.start, "D")).astype(np.int64)
+
+        valid = (known[positions] == resource_ids) & ~np.isnat(days) & (columns >= 0) & (columns < self.days)
+        np.add.at(self.demand, (rows[valid], columns[valid]), np.asarray(counts, dtype=np.int32)[valid])
+
+    def matrices(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Demand, utilization and over-capacity mask per period"""
+        demand = self.demand
+        if self.granularity == "week":
+            weeks = -(-self.days // 7)
+            padded = np.zeros((len(self.resource_ids), weeks * 7), dtype=np.int32)
+            padded[:, :self.days] = demand
+            demand = padded.reshape(len(self.resource_ids), weeks, 7).max(axis=2)
+
+        capacity = self.capacity[:, np.newaxis]
+        utilization = np.divide(
+            demand, capacity,
+            out=np.where(demand > 0, np.inf, 0.0),
+            where=capacity > 0
+        )
+        return demand, utilization, demand > capacity
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Sparse row-encoded heatmap, one entry per resource.
+
+        Each row lists the periods with any demand, the demand and
+        utilization in those periods, and the periods over capacity. Periods
+        without demand are left out. Utilization is null for demand on a
+        resource without capacity.
+        """
+        demand, utilization, over_capacity = self.matrices()
+        peak = utilization.max(axis=1, initial=0.0)
+
+        rows, periods = np.nonzero(demand)
+        boundaries = np.searchsorted(rows, np.arange(1, len(self.resource_ids)))
+        cell_utilization = np.round(utilization[rows, periods], 4)
+        cell_utilization = np.where(np.isinf(cell_utilization), np.nan, cell_utilization)
+        over_rows, over_periods = np.nonzero(over_capacity)
+        over_boundaries = np.searchsorted(over_rows, np.arange(1, len(self.resource_ids)))
+
+        return {
+            "start_date": self.start.isoformat(),
+            "end_date": self.end.isoformat(),
+            "granularity": self.granularity,
+            "periods": demand.shape[1],
+            "resources": [
+                {
+                    "id": resource["id"],
+                    "name": resource.get("name", ""),
+                    "capacity": int(capacity),
+                    "peak_utilization": _finite(round(float(resource_peak), 4)),
+                    "periods": row_periods.tolist(),
+                    "demand": row_demand.tolist(),
+                    "utilization": row_utilization.tolist(),
+                    "over_capacity": row_over.tolist()
+                }
+                for resource, capacity, resource_peak, row_periods, row_demand, row_utilization, row_over in zip(
+                    self.resources, self.capacity, peak,
+                    np.split(periods, boundaries),
+                    np.split(demand[rows, periods], boundaries),
+                    np.split(cell_utilization, boundaries),
+                    np.split(over_periods, over_boundaries)
+                )
+            ]
+        }
+
+    def to_npz(self) -> bytes:
+        """Heatmap as a compressed NumPy archive.
+
+        Utilization is left out since it is demand / capacity.
+        """
+        demand, _, over_capacity = self.matrices()
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            resource_ids=np.array(self.resource_ids, dtype=str),
+            capacity=self.capacity,
+            demand=demand.astype(np.uint16),
+            over_capacity=np.packbits(over_capacity, axis=1),
+            start_date=np.array(self.start.isoformat()),
+            granularity=np.array(self.granularity)
+        )
+        return buffer.getvalue()
+
+def _parse_days(days: List[Optional[str]]) -> np.ndarray:
+    """ISO dates as datetime64[D], NaT where missing or malformed"""
+    try:
+        parsed = np.array(days, dtype="datetime64[D]")
+        lengths = np.fromiter(map(len, days), dtype=np.intp, count=len(days))
+    except (TypeError, ValueError):
+        # Some date does not parse, so parse them one by one to drop only those
+        return np.array([_parse_day(day) for day in days], dtype="datetime64[D]")
+    # NumPy also reads partial dates such as "2025-03", which are not days
+    parsed[lengths != 10] = np.datetime64("NaT")
+    return parsed
+
+def _parse_day(day: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(day)
+    except (TypeError, ValueError):
+        return None
+
+def _finite(value: float):
+    # JSON has no infinity: demand on a resource without capacity
+    return value if value != float("inf") else None
+
+def default_range(settings: Dict[str, Any]) -> Tuple[date, date]:
+    """Course term from the settings, or the coming 18 weeks without them"""
+    try:
+        return date.fromisoformat(settings["start_date"]), date.fromisoformat(settings["end_date"])
+    except (KeyError, TypeError, ValueError):
+        today = date.today()
+        return today, today + timedelta(weeks=18)
@@ -0,0 +1,151 @@
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+class OccupancyIndex:
+    """In-process index of calendar bookings per (resource_id, date).
+
+    The index is rebuilt from the calendar at startup and kept up to date by
+    the write routes, so conflict checks only look at the days they touch.
+    """
+
+    def __init__(self):
+        self._events: Dict[int, Dict[str, Any]] = {}
+        self._slots: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        # Mongo _id of each indexed event, since change streams report deletes by _id only
+        self._event_ids: Dict[Any, int] = {}
+        self.ready = False
+
+    async def rebuild(self, db):
+        """Rebuild the index from every calendar event.
+
+        The new index is built aside and swapped in at the end, so lookups
+        made while it loads still see the previous one.
+        """
+        index = OccupancyIndex()
+        cursor = db.calendar_events.find(
+            {}, {"_id": 1, "id": 1, "unit_id": 1, "lesson_id": 1, "date": 1, "resources": 1}
+        )
+        async for event in cursor:
+            index.add_event(event)
+        self._events, self._slots, self._event_ids = index._events, index._slots, index._event_ids
+        self.ready = True
+
+    @staticmethod
+    def _entry(event: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": event.get("id"),
+            "unit_id": event.get("unit_id"),
+            "lesson_id": event.get("lesson_id"),
+            "date": event.get("date"),
+            "resources": list(dict.fromkeys(event.get("resources", [])))
+        }
+
+    def add_event(self, event: Dict[str, Any]):
+        """Index a created event, replacing any previous version of it"""
+        event_id = event.get("id")
+        previous = self._events.get(event_id)
+        self.remove_event(event_id)
+        entry = self._entry(event)
+        entry["_id"] = event.get("_id", previous and previous["_id"])
+        self._events[event_id] = entry
+        if entry["_id"] is not None:
+            self._event_ids[entry["_id"]] = event_id
+        for resource_id in entry["resources"]:
+            self._slots[(resource_id, entry["date"])].add(event_id)
+
+    def holds(self, event: Dict[str, Any]) -> bool:
+        """Whether this version of an event is already indexed"""
+        entry = self._events.get(event.get("id"))
+        return entry is not None and all(entry[field] == value for field, value in self._entry(event).items())
+
+    def remove_event(self, event_id: int):
+        """Drop a deleted event from the index"""
+        entry = self._events.pop(event_id, None)
+        if entry is None:
+            return
+        self._event_ids.pop(entry["_id"], None)
+        for resource_id in entry["resources"]:
+            self._discard(resource_id, entry["date"], event_id)
+
+    def remove_document(self, document_id: Any) -> bool:
+        """Drop the event stored under a Mongo _id, returning whether it was indexed"""
+        event_id = self._event_ids.get(document_id)
+        if event_id is None:
+            return False
+        self.remove_event(event_id)
+        return True
+
+    def remove_unit(self, unit_id: int):
+        """Drop the events of a deleted unit"""
+        for event_id in [e["id"] for e in self._events.values() if e["unit_id"] == unit_id]:
+            self.remove_event(event_id)
+
+    def remove_lesson(self, unit_id: int, lesson_id: int):
+        """Drop the events of a deleted lesson"""
+        for event_id in [
+            e["id"] for e in self._events.values()
+            if e["unit_id"] == unit_id and e["lesson_id"] == lesson_id
+        ]:
+            self.remove_event(event_id)
+
+    def remove_resource(self, resource_id: str):
+        """Release a deleted resource from every event booking it"""
+        for key in [key for key in self._slots if key[0] == resource_id]:
+            for event_id in self._slots.pop(key):
+                entry = self._events.get(event_id)
+                if entry and resource_id in entry["resources"]:
+                    entry["resources"].remove(resource_id)
+
+    def bookings(self, resource_id: str, date: str) -> Set[int]:
+        """IDs of the events booking a resource on a given day"""
+        return set(self._slots.get((resource_id, date), ()))
+
+    def slot_counts(self) -> Tuple[List[Tuple[str, str]], List[int]]:
+        """Snapshot of every booked (resource_id, date) and its number of bookings.
+
+        Returns two aligned lists. They are copied by C loops, so taking
+        them is quick on the event loop, and another thread may read them
+        while the index keeps changing.
+        """
+        return list(self._slots), list(map(len, self._slots.values()))
+
+    def over_subscribed(self, engine) -> List[Tuple[str, str, List[int]]]:
+        """Every (date, resource_id, event IDs) booked beyond its capacity"""
+        slots = [
+            (date, resource_id, sorted(event_ids))
+            for (resource_id, date), event_ids in self._slots.items()
+            if len(event_ids) > engine.capacity(resource_id)
+        ]
+        slots.sort(key=lambda slot: (slot[0], slot[1]))
+        return slots
+
+    def check(self, date: str, resources: List[str], engine,
+              exclude_event_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Conflicts a booking of resources on date would cause"""
+        conflicts = []
+        for resource_id in dict.fromkeys(resources):
+            event_ids = self.bookings(resource_id, date)
+            event_ids.discard(exclude_event_id)
+            demand = len(event_ids) + 1
+            capacity = engine.capacity(resource_id)
+            if demand > capacity:
+                conflicts.append({
+                    "date": date,
+                    "resource_id": resource_id,
+                    "resource_name": engine.resource_name(resource_id),
+                    "capacity": capacity,
+                    "peak_demand": demand,
+                    "event_ids": sorted(event_ids)
+                })
+        return conflicts
+
+    def _discard(self, resource_id: str, date: str, event_id: int):
+        key = (resource_id, date)
+        event_ids = self._slots.get(key)
+        if event_ids is None:
+            return
+        event_ids.discard(event_id)
+        if not event_ids:
+            del self._slots[key]
+
+occupancy_index = OccupancyIndex()
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, List, Dict, Optional, Tuple, Union
+
+import orjson
+
+class PDFCache:
+    """LRU cache of rendered course PDFs keyed by a hash of their inputs.
+
+    Entries live in memory within an entry and byte budget and, when a
+    directory is configured, are mirrored on disk so they survive restarts.
+    Entries larger than max_memory_entry are only kept on disk, in a
+    private temporary directory when none is configured, so caching a
+    large render never loads it whole.
+    The render time printed on the title page is not part of the key: a
+    cached document keeps the time at which it was first rendered.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 directory: Optional[str] = None, max_memory_entry: Optional[int] = None):
+        self.max_entries = max_entries or int(os.environ.get("PDF_CACHE_ENTRIES", "16"))
+        self.max_bytes = max_bytes or int(os.environ.get("PDF_CACHE_BYTES", str(64 * 1024 * 1024)))
+        self.max_memory_entry = max_memory_entry or int(
+            os.environ.get("PDF_CACHE_MEMORY_ENTRY_BYTES", str(2 * 1024 * 1024))
+        )
+        directory = directory or os.environ.get("PDF_CACHE_DIR")
+        self.directory = Path(directory) if directory else None
+        self._spill_directory: Optional[Path] = None
+        # Each entry is its bytes, or the path of its file when kept on disk only
+        self._entries: "OrderedDict[str, Tuple[Union[bytes, Path], int]]" = OrderedDict()
+        self._size = 0
+
+    @staticmethod
+    def key(settings: Dict, units: List[Dict], resources: List[Dict],
+            events: List[Dict], options) -> str:
+        """Content hash of everything a render depends on"""
+        payload = orjson.dumps(
+            [settings, units, resources, events, options.dict()],
+            option=orjson.OPT_SORT_KEYS,
+            default=str
+        )
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key: str) -> Union[bytes, BinaryIO, None]:
+        """Cached PDF as bytes, or as an open file the caller must close
+        when it is kept on disk only"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            data = entry[0]
+            if isinstance(data, bytes):
+                return data
+            try:
+                # Open now, so evicting the entry later cannot pull the file
+                # from under a response still streaming it
+                return open(data, "rb")
+            except OSError:
+                self._remove(key)
+                return None
+
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            size = path.stat().st_size
+            if size > self.max_memory_entry:
+                pdf_file = open(path, "rb")
+                self._store(key, path, size)
+                return pdf_file
+            data = path.read_bytes()
+        except OSError:
+            return None
+        self._store(key, data, len(data))
+        return data
+
+    def put(self, key: str, data: bytes):
+        size = len(data)
+        if size > self.max_bytes:
+            return
+
+        path = self._path(key) if size <= self.max_memory_entry else self._disk_path(key)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+        self._store(key, data if size <= self.max_memory_entry else path, size)
+
+    def put_file(self, key: str, path: str):
+        """Cache a PDF rendered to a file, unless it exceeds the byte budget.
+
+        Only files within max_memory_entry are read into memory, larger
+        ones are copied on disk.
+        """
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+
+        cache_path = self._path(key) if size <= self.max_memory_entry else self._disk_path(key)
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(".tmp")
+            shutil.copyfile(path, tmp_path)
+            tmp_path.replace(cache_path)
+        if size > self.max_memory_entry:
+            self._store(key, cache_path, size)
+            return
+
+        with open(path, "rb") as pdf_file:
+            self._store(key, pdf_file.read(), size)
+
+    def clear(self):
+        """Drop every cached PDF, in memory and on disk"""
+        self._entries.clear()
+        self._size = 0
+        for directory in (self.directory, self._spill_directory):
+            if directory is not None and directory.exists():
+                for path in directory.glob("*.pdf"):
+                    path.unlink(missing_ok=True)
+
+    def _store(self, key: str, data: Union[bytes, Path], size: int):
+        self._remove(key, unlink=False)
+        self._entries[key] = (data, size)
+        self._size += size
+
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str, unlink: bool = True):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        data, size = entry
+        self._size -= size
+        if unlink:
+            path = data if isinstance(data, Path) else self._path(key)
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+    def _disk_path(self, key: str) -> Path:
+        """Path of an entry kept on disk only"""
+        if self.directory is not None:
+            return self.directory / f"{key}.pdf"
+        if self._spill_directory is None:
+            self._spill_directory = Path(tempfile.mkdtemp(prefix="icd201_pdfcache_"))
+        return self._spill_directory / f"{key}.pdf"
+
+    def _path(self, key: str) -> Optional[Path]:
+        if self.directory is None:
+            return None
+        return self.directory / f"{key}.pdf"
+
+pdf_cache = PDFCache()
@@ -0,0 +1,75 @@
+import copy
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import orjson
+from reportlab.platypus import Paragraph
+
+# Export options that change how a unit section is drawn
+UNIT_FRAGMENT_OPTIONS = ("include_objectives", "include_lessons", "include_activities", "detail_level")
+
+class FragmentParagraph(Paragraph):
+    """Paragraph remembering its line breaks per available width.
+
+    Shallow copies share the memo, so a cached unit section is only broken
+    into lines once for a given frame width.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._line_breaks = {}
+
+    def breakLines(self, width):
+        key = tuple(width) if isinstance(width, (list, tuple)) else (width,)
+        broken = self._line_breaks.get(key)
+        if broken is None:
+            blPara = super().breakLines(width)
+            broken = self._line_breaks[key] = (blPara, self.frags, self._width_max)
+        blPara, self.frags, self._width_max = broken
+        return blPara
+
+class UnitFragmentCache:
+    """LRU cache of the flowables of each unit section.
+
+    A fragment is keyed by the unit id, a hash of the unit document and the
+    export options it depends on, so editing a unit or one of its lessons
+    only rebuilds that unit. The hash covers the content itself rather than
+    updated_at, whose millisecond precision cannot tell apart two changes
+    made within the same millisecond. Cached flowables are never laid out
+    themselves: each document gets shallow copies, which share the parsed
+    paragraphs, line breaks and table data but not the layout state
+    ReportLab stores on a flowable during a build.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or int(os.environ.get("PDF_FRAGMENT_CACHE_ENTRIES", "256"))
+        self._entries: "OrderedDict[tuple, List]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(unit: Dict, options) -> tuple:
+        content = hashlib.sha256(orjson.dumps(unit, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+        return (unit.get("id"), content) + tuple(getattr(options, field) for field in UNIT_FRAGMENT_OPTIONS)
+
+    def get_or_build(self, unit: Dict, options, build: Callable[[Dict, object], List]) -> List:
+        """Cached flowables of a unit section, built with build(unit, options) on a miss"""
+        key = self.key(unit, options)
+        fragment = self._entries.get(key)
+        if fragment is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            fragment = build(unit, options)
+            self._entries[key] = fragment
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return [copy.copy(flowable) for flowable in fragment]
+
+    def clear(self):
+        self._entries.clear()
+
+unit_fragments = UnitFragmentCache()
@@ -1,89 +1,203 @@
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 import io
 from datetime import datetime
-from typing import List, Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import List, Dict, Any, BinaryIO, Callable, Optional
+
+from services.pdf_fragments import FragmentParagraph, unit_fragments
+
+# Table styles shared by every render, built once per process
+TABLE_STYLES = MappingProxyType({
+    'course_info': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey)
+    ]),
+    'table_of_contents': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, 0), 1, colors.black),
+        ('LINEBELOW', (0, 0), (-1, 0), 2, colors.black)
+    ]),
+    'course_stats': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey)
+    ]),
+    'units_summary': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey)
+    ]),
+    'unit_info': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
+    ]),
+    'lessons': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey)
+    ]),
+    'resources': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP')
+    ]),
+    'calendar_events': TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey)
+    ])
+})
+
+@lru_cache(maxsize=None)
+def get_styles() -> StyleSheet1:
+    """Paragraph styles shared by every render, built once per process"""
+    styles = getSampleStyleSheet()
+    
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        textColor=colors.darkblue
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CustomHeading2',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceBefore=20,
+        spaceAfter=12,
+        textColor=colors.darkblue
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CustomHeading3',
+        parent=styles['Heading3'],
+        fontSize=14,
+        spaceBefore=15,
+        spaceAfter=8,
+        textColor=colors.blue
+    ))
+    
+    return styles
+
+def warm_up():
+    """Build the shared styles ahead of the first render"""
+    get_styles()
 
 class PDFGenerator:
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
-    
-    def _setup_custom_styles(self):
-        """Setup custom paragraph styles"""
-        self.styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=self.styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=colors.darkblue
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='CustomHeading2',
-            parent=self.styles['Heading2'],
-            fontSize=16,
-            spaceBefore=20,
-            spaceAfter=12,
-            textColor=colors.darkblue
-        ))
-        
-        self.styles.add(ParagraphStyle(
-            name='CustomHeading3',
-            parent=self.styles['Heading3'],
-            fontSize=14,
-            spaceBefore=15,
-            spaceAfter=8,
-            textColor=colors.blue
-        ))
+        self.styles = get_styles()
     
     def generate_course_pdf(self, settings: Dict, units: List[Dict], 
                           resources: List[Dict], events: List[Dict], 
-                          options) -> bytes:
+                          options, progress: Optional[Callable[[str, int, int], None]] = None) -> bytes:
         """Generate complete course PDF"""
         buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
+        self.write_course_pdf(buffer, settings, units, resources, events, options, progress)
+        return buffer.getvalue()
+    
+    def write_course_pdf(self, output: BinaryIO, settings: Dict, units: List[Dict],
+                         resources: List[Dict], events: List[Dict],
+                         options, progress: Optional[Callable[[str, int, int], None]] = None):
+        """Write complete course PDF to a binary file object
+        
+        progress, when given, is called as progress(section, completed, total)
+        after each section is laid out.
+        """
+        doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=72, leftMargin=72,
                               topMargin=72, bottomMargin=18)
         
+        include_toc = options.detail_level == "detailed"
+        include_resources = options.include_resources and resources
+        include_schedule = options.include_schedule and events
+        
+        # Title, overview, each unit and the final page layout
+        total_sections = 3 + len(units) + sum(map(bool, [include_toc, include_resources, include_schedule]))
+        completed_sections = 0
+        
+        def section_done(section: str):
+            nonlocal completed_sections
+            completed_sections += 1
+            if progress:
+                progress(section, completed_sections, total_sections)
+        
         story = []
         
         # Title page
         story.extend(self._create_title_page(settings))
         story.append(PageBreak())
+        section_done("Page titre")
         
         # Table of contents
-        if options.detail_level == "detailed":
+        if include_toc:
             story.extend(self._create_table_of_contents(units, options))
             story.append(PageBreak())
+            section_done("Table des matières")
         
         # Course overview
         story.extend(self._create_course_overview(settings, units))
         story.append(Spacer(1, 20))
+        section_done("Vue d'ensemble du cours")
         
-        # Units sections
+        # Units sections, reusing the flowables of unchanged units
         for unit in units:
-            story.extend(self._create_unit_section(unit, options))
+            story.extend(unit_fragments.get_or_build(unit, options, self._create_unit_section))
             story.append(Spacer(1, 15))
+            section_done(f"Unité {unit.get('id')}")
         
         # Resources section
-        if options.include_resources and resources:
+        if include_resources:
             story.extend(self._create_resources_section(resources, units))
             story.append(Spacer(1, 20))
+            section_done("Ressources technologiques")
         
         # Calendar section
-        if options.include_schedule and events:
+        if include_schedule:
             story.extend(self._create_calendar_section(events, units))
             story.append(Spacer(1, 20))
+            section_done("Planification calendaire")
         
         # Build PDF
         doc.build(story)
-        buffer.seek(0)
-        return buffer.getvalue()
+        section_done("Mise en page")
     
     def _create_title_page(self, settings: Dict) -> List:
         """Create PDF title page"""
@@ -115,14 +229,7 @@ class PDFGenerator:
         ]
         
         course_table = Table(course_data, colWidths=[2*inch, 2*inch])
-        course_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey)
-        ]))
+        course_table.setStyle(TABLE_STYLES['course_info'])
         
         story.append(course_table)
         story.append(Spacer(1, 40))
@@ -165,15 +272,7 @@ class PDFGenerator:
             toc_data.append(['Planification calendaire', str(page_num)])
         
         toc_table = Table(toc_data, colWidths=[4*inch, 1*inch])
-        toc_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, 0), 1, colors.black),
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.black)
-        ]))
+        toc_table.setStyle(TABLE_STYLES['table_of_contents'])
         
         story.append(toc_table)
         return story
@@ -197,14 +296,7 @@ class PDFGenerator:
         ]
         
         stats_table = Table(stats_data, colWidths=[2.5*inch, 1.5*inch])
-        stats_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey)
-        ]))
+        stats_table.setStyle(TABLE_STYLES['course_stats'])
         
         story.append(stats_table)
         story.append(Spacer(1, 20))
@@ -223,15 +315,7 @@ class PDFGenerator:
             ])
         
         units_table = Table(units_data, colWidths=[0.7*inch, 3*inch, 0.8*inch, 0.8*inch])
-        units_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey)
-        ]))
+        units_table.setStyle(TABLE_STYLES['units_summary'])
         
         story.append(units_table)
         return story
@@ -242,12 +326,12 @@ class PDFGenerator:
         
         # Unit title
         title = f"Unité {unit.get('id')}: {unit.get('title')}"
-        story.append(Paragraph(title, self.styles['CustomHeading2']))
+        story.append(FragmentParagraph(title, self.styles['CustomHeading2']))
         story.append(Spacer(1, 10))
         
         # Unit description
         description = unit.get('description', '')
-        story.append(Paragraph(description, self.styles['Normal']))
+        story.append(FragmentParagraph(description, self.styles['Normal']))
         story.append(Spacer(1, 15))
         
         # Unit info
@@ -257,31 +341,26 @@ class PDFGenerator:
         ]
         
         info_table = Table(info_data, colWidths=[1.5*inch, 2*inch])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6)
-        ]))
+        info_table.setStyle(TABLE_STYLES['unit_info'])
         
         story.append(info_table)
         story.append(Spacer(1, 15))
         
         # Objectives
         if options.include_objectives and unit.get('objectives'):
-            story.append(Paragraph("Objectifs d'apprentissage", self.styles['CustomHeading3']))
+            story.append(FragmentParagraph("Objectifs d'apprentissage", self.styles['CustomHeading3']))
             story.append(Spacer(1, 8))
             
             for i, objective in enumerate(unit.get('objectives', []), 1):
                 obj_text = f"{i}. {objective}"
-                story.append(Paragraph(obj_text, self.styles['Normal']))
+                story.append(FragmentParagraph(obj_text, self.styles['Normal']))
                 story.append(Spacer(1, 4))
             
             story.append(Spacer(1, 15))
         
         # Lessons
         if options.include_lessons and unit.get('lessons'):
-            story.append(Paragraph("Leçons", self.styles['CustomHeading3']))
+            story.append(FragmentParagraph("Leçons", self.styles['CustomHeading3']))
             story.append(Spacer(1, 10))
             
             lessons_data = [['#', 'Titre', 'Durée', 'Ressources']]
@@ -299,15 +378,7 @@ class PDFGenerator:
                 ])
             
             lessons_table = Table(lessons_data, colWidths=[0.5*inch, 2.5*inch, 0.7*inch, 1.5*inch])
-            lessons_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey)
-            ]))
+            lessons_table.setStyle(TABLE_STYLES['lessons'])
             
             story.append(lessons_table)
             
@@ -315,16 +386,16 @@ class PDFGenerator:
             if options.detail_level == "detailed":
                 story.append(Spacer(1, 15))
                 for lesson in unit.get('lessons', []):
-                    story.append(Paragraph(f"Leçon: {lesson.get('title')}", self.styles['Heading4']))
+                    story.append(FragmentParagraph(f"Leçon: {lesson.get('title')}", self.styles['Heading4']))
                     story.append(Spacer(1, 6))
                     
                     if lesson.get('content'):
-                        story.append(Paragraph(lesson.get('content'), self.styles['Normal']))
+                        story.append(FragmentParagraph(lesson.get('content'), self.styles['Normal']))
                         story.append(Spacer(1, 8))
                     
                     if options.include_activities and lesson.get('activities'):
                         activities_text = "Activités: " + ", ".join(lesson.get('activities', []))
-                        story.append(Paragraph(activities_text, self.styles['Normal']))
+                        story.append(FragmentParagraph(activities_text, self.styles['Normal']))
                         story.append(Spacer(1, 10))
         
         return story
@@ -347,16 +418,7 @@ class PDFGenerator:
             ])
         
         resources_table = Table(resources_data, colWidths=[1.5*inch, 0.8*inch, 2.2*inch, 1.2*inch])
-        resources_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP')
-        ]))
+        resources_table.setStyle(TABLE_STYLES['resources'])
         
         story.append(resources_table)
         return story
@@ -403,15 +465,7 @@ class PDFGenerator:
                 ])
             
             events_table = Table(events_data, colWidths=[0.8*inch, 2.5*inch, 0.6*inch, 1.3*inch])
-            events_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey)
-            ]))
+            events_table.setStyle(TABLE_STYLES['calendar_events'])
             
             story.append(events_table)
             story.append(Spacer(1, 15))
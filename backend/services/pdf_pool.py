@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Optional, Set
+
+from services.pdf_generator import PDFGenerator, warm_up
+
+class RenderPoolSaturated(Exception):
+    """Raised when every render slot is busy and the wait queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("PDF render queue is full")
+        self.retry_after = retry_after
+
+def _render_course_pdf_to_file(path: str, settings: Dict, units: List[Dict], resources: List[Dict],
+                               events: List[Dict], options, progress_queue=None) -> int:
+    """Render a course PDF to a file inside a worker process, reporting progress"""
+    progress = None
+    if progress_queue is not None:
+        progress = lambda section, completed, total: progress_queue.put((section, completed, total))
+
+    with open(path, "wb") as output:
+        PDFGenerator().write_course_pdf(
+            output,
+            settings=settings,
+            units=units,
+            resources=resources,
+            events=events,
+            options=options,
+            progress=progress
+        )
+        return output.tell()
+
+class PDFRenderPool:
+    """Bounded set of worker processes keeping ReportLab layout off the event loop.
+
+    At most max_workers renders run at once and at most max_queue more wait
+    for a slot; beyond that run() raises RenderPoolSaturated. Each slot has
+    its own single-process executor, so a render exceeding the timeout can
+    be stopped on its own: its worker is killed, which raises
+    asyncio.TimeoutError in the caller, and the slot is handed back once
+    the worker is gone. The next render of that slot starts a fresh worker.
+    The deadline is kept even when the caller is cancelled, so an abandoned
+    render cannot hold its slot for good.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 timeout: Optional[float] = None, retry_after: Optional[int] = None):
+        self.max_workers = max_workers or int(os.environ.get("PDF_RENDER_WORKERS", "2"))
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get("PDF_RENDER_QUEUE", "8"))
+        self.timeout = timeout or float(os.environ.get("PDF_RENDER_TIMEOUT", "120"))
+        self.retry_after = retry_after or int(os.environ.get("PDF_RENDER_RETRY_AFTER", "10"))
+        self.recycled = 0
+        self._idle: List[ProcessPoolExecutor] = []
+        self._busy: Set[ProcessPoolExecutor] = set()
+        self._slots = None
+        self._pending = 0
+
+    def _new_worker(self) -> ProcessPoolExecutor:
+        # Spawned workers do not inherit the event loop or Mongo client
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up
+        )
+
+    async def warm_up(self):
+        """Start every worker process so they build their PDF styles up front"""
+        loop = asyncio.get_running_loop()
+        while len(self._idle) + len(self._busy) < self.max_workers:
+            self._idle.append(self._new_worker())
+        await asyncio.gather(*[
+            loop.run_in_executor(executor, warm_up) for executor in self._idle
+        ])
+
+    async def run(self, func, *args, timeout: Optional[float] = None):
+        """Run a picklable function in the pool within the render limits"""
+        if self._pending >= self.max_workers + self.max_queue:
+            raise RenderPoolSaturated(self.retry_after)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+
+        self._pending += 1
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._pending -= 1
+            raise
+
+        loop = asyncio.get_running_loop()
+        executor = self._idle.pop() if self._idle else self._new_worker()
+        self._busy.add(executor)
+        try:
+            future = loop.run_in_executor(executor, func, *args)
+        except BaseException:
+            self._finish(executor)
+            raise
+        # A render cannot be interrupted, so its worker is killed at the
+        # deadline, which fails the future and hands the slot back to a fresh
+        # worker. Armed on the loop, it holds even once the caller is gone.
+        deadline = loop.call_later(timeout or self.timeout, self._kill, executor)
+        # Runs once the worker is done, even when the caller stopped waiting
+        future.add_done_callback(functools.partial(self._finish, executor, deadline))
+
+        try:
+            return await asyncio.shield(future)
+        except BrokenProcessPool:
+            if loop.time() >= deadline.when():
+                raise asyncio.TimeoutError()
+            raise
+
+    def _finish(self, executor: ProcessPoolExecutor, deadline: Optional[asyncio.TimerHandle] = None,
+                future: Optional[asyncio.Future] = None):
+        """Hand a slot back, keeping its worker for the next render unless it broke or was killed"""
+        if deadline is not None:
+            deadline.cancel()
+        healthy = (
+            future is not None and not future.cancelled()
+            and not isinstance(future.exception(), BrokenProcessPool)
+            and executor in self._busy
+        )
+        self._busy.discard(executor)
+        if healthy:
+            self._idle.append(executor)
+        else:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._pending -= 1
+        self._slots.release()
+
+    def _kill(self, executor: ProcessPoolExecutor):
+        self.recycled += 1
+        self._busy.discard(executor)
+        # ProcessPoolExecutor has no public way to stop a running task
+        for process in list(executor._processes.values()):
+            process.kill()
+
+    async def render_to_file(self, path: str, settings: Dict, units: List[Dict], resources: List[Dict],
+                             events: List[Dict], options, progress_queue=None,
+                             timeout: Optional[float] = None) -> int:
+        """Render a course PDF to path in a worker process and return its size"""
+        return await self.run(
+            _render_course_pdf_to_file, path, settings, units, resources, events, options, progress_queue,
+            timeout=timeout
+        )
+
+    def shutdown(self):
+        for executor in self._idle + list(self._busy):
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._idle = []
+        self._busy = set()
+
+pdf_render_pool = PDFRenderPool()
@@ -0,0 +1,135 @@
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReplaceOne
+
+from models.settings import CourseSettings
+
+def usage_pipeline(resource_ids: Optional[List[str]] = None, unit_ids: Optional[List[int]] = None) -> List[Dict]:
+    """Aggregation over units giving hours, lessons and units per resource.
+
+    A lesson listing a resource twice is counted once, like a membership
+    test on its resources would.
+    """
+    match = {}
+    if unit_ids:
+        match["id"] = {"$in": unit_ids}
+    if resource_ids is not None:
+        match["lessons.resources"] = {"$in": resource_ids}
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$project": {"_id": 0, "id": 1, "title": 1, "lessons.id": 1, "lessons.duration": 1, "lessons.resources": 1}},
+        {"$unwind": "$lessons"},
+        {"$unwind": "$lessons.resources"}
+    ]
+    if resource_ids is not None:
+        pipeline.append({"$match": {"lessons.resources": {"$in": resource_ids}}})
+    pipeline += [
+        {"$group": {
+            "_id": {"resource": "$lessons.resources", "unit": "$id", "lesson": "$lessons.id"},
+            "duration": {"$first": "$lessons.duration"},
+            "unit_title": {"$first": "$title"}
+        }},
+        {"$group": {
+            "_id": {"resource": "$_id.resource", "unit": "$_id.unit"},
+            "hours": {"$sum": "$duration"},
+            "lessons": {"$sum": 1},
+            "unit_title": {"$first": "$unit_title"}
+        }},
+        {"$sort": {"_id.unit": 1}},
+        {"$group": {
+            "_id": "$_id.resource",
+            "total_hours": {"$sum": "$hours"},
+            "lessons_count": {"$sum": "$lessons"},
+            "units_using": {"$push": {"unit_id": "$_id.unit", "unit_title": "$unit_title"}}
+        }}
+    ]
+    return pipeline
+
+async def compute_resource_usage(db, resource_ids: Optional[List[str]] = None,
+                                 unit_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Usage of the given resources, or of all of them, as ResourceUsage fields.
+
+    Utilization is relative to the course total hours from the settings.
+    Only units in unit_ids count when it is given. Resources are returned
+    in id order and unused ones have zero usage.
+    """
+    resource_filter = {"id": {"$in": resource_ids}} if resource_ids is not None else {}
+    resources, usage, settings = await asyncio.gather(
+        db.resources.find(resource_filter, {"_id": 0, "id": 1, "name": 1}).sort("id", 1).to_list(None),
+        db.units.aggregate(usage_pipeline(resource_ids, unit_ids)).to_list(None),
+        db.course_settings.find_one({}, {"_id": 0, "total_hours": 1})
+    )
+    course_hours = (settings or {}).get("total_hours") or CourseSettings().total_hours
+    usage = {entry["_id"]: entry for entry in usage}
+
+    results = []
+    for resource in resources:
+        entry = usage.get(resource["id"], {})
+        total_hours = entry.get("total_hours", 0)
+        results.append({
+            "resource_id": resource["id"],
+            "resource_name": resource.get("name", ""),
+            "total_hours": total_hours,
+            "lessons_count": entry.get("lessons_count", 0),
+            "units_using": entry.get("units_using", []),
+            "utilization_percentage": round(total_hours / course_hours * 100, 2)
+        })
+    return results
+
+def lesson_resources(lessons: Iterable[Dict[str, Any]]) -> set:
+    """IDs of the resources used by any of the lessons"""
+    return {resource_id for lesson in lessons for resource_id in lesson.get("resources", [])}
+
+class ResourceUsageView:
+    """Resource usage materialized in the resource_usage collection.
+
+    Holds one document per resource with the ResourceUsage fields, so a read
+    is a single find_one on resource_id. Writes call refresh() with the
+    resources they touched, which recomputes just those documents from the
+    units using them. Settings changes alter every utilization and call
+    rebuild(). check() compares the view with a full recomputation.
+    """
+
+    async def get(self, db, resource_id: str) -> Optional[Dict[str, Any]]:
+        return await db.resource_usage.find_one({"resource_id": resource_id}, {"_id": 0})
+
+    async def all(self, db, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        return await db.resource_usage.find({}, projection or {"_id": 0}).sort("resource_id", 1).to_list(None)
+
+    async def refresh(self, db, resource_ids: Iterable[str]):
+        """Recompute the usage of the given resources, dropping deleted ones"""
+        resource_ids = sorted(set(resource_ids))
+        if not resource_ids:
+            return
+        usage = await compute_resource_usage(db, resource_ids)
+        await self._store(db, usage)
+        stale = set(resource_ids) - {entry["resource_id"] for entry in usage}
+        if stale:
+            await db.resource_usage.delete_many({"resource_id": {"$in": sorted(stale)}})
+
+    async def rebuild(self, db) -> int:
+        """Recompute every document and return how many resources there are"""
+        usage = await compute_resource_usage(db)
+        await self._store(db, usage)
+        await db.resource_usage.delete_many({"resource_id": {"$nin": [entry["resource_id"] for entry in usage]}})
+        return len(usage)
+
+    async def check(self, db) -> List[Dict[str, Any]]:
+        """Differences between the view and a full recomputation, empty when consistent"""
+        expected, stored = await asyncio.gather(compute_resource_usage(db), self.all(db))
+        expected = {entry["resource_id"]: entry for entry in expected}
+        stored = {entry["resource_id"]: entry for entry in stored}
+        return [
+            {"resource_id": resource_id, "expected": expected.get(resource_id), "stored": stored.get(resource_id)}
+            for resource_id in sorted(expected.keys() | stored.keys())
+            if expected.get(resource_id) != stored.get(resource_id)
+        ]
+
+    async def _store(self, db, usage: List[Dict[str, Any]]):
+        if usage:
+            await db.resource_usage.bulk_write([
+                ReplaceOne({"resource_id": entry["resource_id"]}, entry, upsert=True) for entry in usage
+            ], ordered=False)
+
+resource_usage_view = ResourceUsageView()
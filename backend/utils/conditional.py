@@ -0,0 +1,80 @@
+import hashlib
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+from utils.database import collection_versions
+
+# Collection versions are counted per process, so validators carry the process
+# they were issued by and never match what another worker or a restart issued
+PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+# Read endpoints answered by ConditionalGetMiddleware, with the collections
+# their responses are built from
+CONDITIONAL_ROUTES = {
+    "/api/units": ("units",),
+    "/api/resources": ("resources",),
+    "/api/calendar/events": ("calendar_events",),
+    "/api/calendar/weeks": ("calendar_events", "course_settings"),
+    "/api/settings": ("course_settings",),
+}
+
+def collections_etag(collections: Iterable[str], *variant: str) -> str:
+    """Strong ETag of a representation built from collections.
+
+    Changes whenever one of the collections is written to. variant holds
+    anything else the representation depends on, such as selected fields or
+    the content encoding. Read it before the documents, so a response is
+    never tagged with versions newer than its content.
+    """
+    versions = ",".join(f"{name}:{collection_versions[name]}" for name in sorted(set(collections)))
+    digest = hashlib.sha1("|".join((versions,) + variant).encode()).hexdigest()[:16]
+    return f'"{PROCESS_TOKEN}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag, comparing weakly as RFC 9110 asks"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag.removeprefix("W/")
+        for candidate in if_none_match.split(",")
+    )
+
+class ConditionalGetMiddleware:
+    """ETag and If-None-Match handling for the endpoints in CONDITIONAL_ROUTES.
+
+    The validator is computed from the collection versions, the path and the
+    sorted query string before the route runs, so a matching request gets a
+    304 without any query or serialization, and a 200 response is tagged
+    without reading its body.
+    """
+
+    def __init__(self, app, routes: Dict[str, Tuple[str, ...]] = CONDITIONAL_ROUTES):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "").rstrip("/")
+        if scope["type"] != "http" or scope["method"] != "GET" or path not in self.routes:
+            await self.app(scope, receive, send)
+            return
+
+        query = "&".join(sorted(scope["query_string"].decode("latin-1").split("&")))
+        etag = collections_etag(self.routes[path], path, query)
+        if etag_matches(Headers(scope=scope).get("if-none-match"), etag):
+            response = Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+            await response(scope, receive, send)
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                headers["ETag"] = etag
+                headers["Cache-Control"] = "no-cache"
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -1,19 +1,198 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import OperationFailure
+import copy
+import functools
 import os
+import time
+import typing
+from collections import OrderedDict, defaultdict
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Awaitable, Callable, Hashable, Iterable, Optional, Tuple
+
+import orjson
+from pydantic import BaseModel
 
 # Initialize database connection (will be set in server.py)
 client = None
 db = None
 
+# Version of each collection in this process, bumped on every write to it
+collection_versions: Dict[str, int] = defaultdict(int)
+
+# Indexes applied at startup, per collection
+INDEXES = {
+    "units": [
+        # IDs handed out by the counters must stay unique
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("lessons.id", ASCENDING)]),
+        # Units using a resource, when refreshing its usage
+        IndexModel([("lessons.resources", ASCENDING)]),
+        # Newest change, polled when change streams are unavailable
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "resources": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "calendar_events": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Keyset pagination and date range scans of the calendar
+        IndexModel([("date", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("unit_id", ASCENDING), ("lesson_id", ASCENDING)]),
+        IndexModel([("resources", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    "resource_usage": [
+        IndexModel([("resource_id", ASCENDING)], unique=True),
+    ],
+    "export_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)]),
+    ],
+}
+
+# Query shapes issued by the routes, checked against the indexes above
+QUERY_SHAPES = [
+    ("units", {"id": 1}, None),
+    ("units", {"id": 1, "lessons.id": 101}, None),
+    ("units", {"id": {"$in": [1, 2]}}, None),
+    ("resources", {"id": "ordinateurs"}, None),
+    ("resources", {"id": {"$in": ["ordinateurs", "iPad"]}}, None),
+    ("units", {"lessons.resources": {"$in": ["ordinateurs"]}}, None),
+    ("units", {}, [("updated_at", DESCENDING)]),
+    ("resources", {}, [("updated_at", DESCENDING)]),
+    ("resource_usage", {"resource_id": "ordinateurs"}, None),
+    ("resource_usage", {}, [("resource_id", ASCENDING)]),
+    ("calendar_events", {"id": 1}, None),
+    ("calendar_events", {"id": {"$in": [1, 2]}}, None),
+    ("calendar_events", {}, [("date", ASCENDING), ("id", ASCENDING)]),
+    ("calendar_events", {"date": {"$gte": "2025-01-15", "$lte": "2025-05-30"}}, [("date", ASCENDING)]),
+    ("calendar_events", {"unit_id": 1}, [("date", ASCENDING), ("id", ASCENDING)]),
+    ("calendar_events", {"resources": "ordinateurs"}, [("date", ASCENDING), ("id", ASCENDING)]),
+    ("calendar_events", {"unit_id": 1, "lesson_id": 101}, None),
+    ("calendar_events", {"date": "2025-01-15", "resources": {"$in": ["ordinateurs"]}}, None),
+    ("calendar_events", {}, [("updated_at", DESCENDING)]),
+    ("export_jobs", {"id": "0"}, None),
+    ("export_jobs", {"status": "queued"}, [("created_at", ASCENDING)]),
+    ("export_jobs", {"expires_at": {"$lt": datetime(2025, 1, 1)}}, None),
+]
+
+# What startup does when a query shape scans a whole collection: "fail" stops
+# it, "warn" only logs, such as while a new index is still being rolled out
+QUERY_PLAN_CHECK = os.environ.get("QUERY_PLAN_CHECK", "fail")
+
 def init_database():
     """Initialize database connection"""
     global client, db
     client = AsyncIOMotorClient(os.environ['MONGO_URL'])
     db = client[os.environ['DB_NAME']]
 
+class ReadCache:
+    """Read-through LRU cache of query results, invalidated by collection versions.
+
+    Each entry remembers the versions of the collections it was read from
+    and is only served while none of them has been written to and its TTL
+    has not run out. A result read while a write happened is returned but
+    not stored. Cached documents are shared between requests and must not
+    be modified.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries or int(os.environ.get("READ_CACHE_ENTRIES", "128"))
+        self.ttl = ttl if ttl is not None else float(os.environ.get("READ_CACHE_TTL", "300"))
+        self._entries: "OrderedDict[Hashable, Tuple[tuple, float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get_or_load(self, key: Hashable, collections: Iterable[str],
+                          loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached result for key, or the result of loader() stored under it"""
+        collections = tuple(collections)
+        versions = tuple(collection_versions[name] for name in collections)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == versions and entry[1] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        value = await loader()
+        if versions == tuple(collection_versions[name] for name in collections):
+            self._store(key, versions, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _store(self, key: Hashable, versions: tuple, value: Any):
+        self._entries[key] = (versions, time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+read_cache = ReadCache()
+
+def _has_stage(plan: Any, stage: str) -> bool:
+    """Whether a query plan tree contains the given stage"""
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(_has_stage(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_stage(value, stage) for value in plan)
+    return False
+
+@functools.lru_cache(maxsize=None)
+def _field_defaults(model) -> Tuple[Dict[str, Any], Dict[str, Callable[[], Any]], Dict[str, Tuple[Any, bool]]]:
+    """Immutable defaults, default factories and nested models of a model's fields"""
+    defaults, factories, nested = {}, {}, {}
+    for name, field in model.model_fields.items():
+        if field.default_factory is not None:
+            factories[name] = field.default_factory
+        elif not field.is_required():
+            if isinstance(field.default, (list, dict)):
+                factories[name] = functools.partial(copy.copy, field.default)
+            else:
+                defaults[name] = field.default
+
+        annotation, many = field.annotation, typing.get_origin(field.annotation) is list
+        if many:
+            annotation = typing.get_args(annotation)[0]
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            nested[name] = (annotation, many)
+    return defaults, factories, nested
+
+async def _duplicate_keys(collection: str, index: IndexModel, limit: int = 10) -> List[str]:
+    """Key values held by more than one document, which keep a unique index from being built"""
+    fields = {field.replace(".", "_"): field for field in index.document["key"]}
+    duplicates = await db[collection].aggregate([
+        {"$group": {"_id": {name: f"${field}" for name, field in fields.items()}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit}
+    ]).to_list(None)
+    return [
+        ", ".join(f"{field}={duplicate['_id'].get(name)!r}" for name, field in fields.items())
+        + f" ({duplicate['count']} documents)"
+        for duplicate in duplicates
+    ]
+
 class DatabaseManager:
     @staticmethod
     def serialize_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
@@ -36,6 +215,153 @@ class DatabaseManager:
         """Convert list of MongoDB documents to JSON serializable format"""
         return [DatabaseManager.serialize_doc(doc) for doc in docs]
 
+    @staticmethod
+    def notify_write(*collections: str):
+        """Bump the versions of collections, so caches and ETags built on them change"""
+        for collection in collections:
+            collection_versions[collection] += 1
+
+    @staticmethod
+    async def cached_find(collection: str, filter_query: Optional[Dict] = None,
+                          projection: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Documents of a find through the read cache"""
+        filter_query = filter_query or {}
+        key = ("find", collection, orjson.dumps([filter_query, projection], option=orjson.OPT_SORT_KEYS))
+        return await read_cache.get_or_load(
+            key, (collection,), lambda: db[collection].find(filter_query, projection).to_list(None)
+        )
+
+    @staticmethod
+    async def cached_find_one(collection: str, filter_query: Optional[Dict] = None,
+                              projection: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """Document of a find_one through the read cache"""
+        filter_query = filter_query or {}
+        key = ("find_one", collection, orjson.dumps([filter_query, projection], option=orjson.OPT_SORT_KEYS))
+        return await read_cache.get_or_load(
+            key, (collection,), lambda: db[collection].find_one(filter_query, projection)
+        )
+
+    @staticmethod
+    def projection(model) -> Dict[str, int]:
+        """Projection returning only the fields of a response model, without _id.
+
+        Documents read this way can be encoded directly with ORJSONResponse,
+        which handles BSON datetimes natively, once with_defaults() has
+        filled the fields they lack.
+        """
+        projection = {field: 1 for field in model.model_fields}
+        projection["_id"] = 0
+        return projection
+
+    @staticmethod
+    def with_defaults(model, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a projected document with the defaults of the fields it lacks.
+
+        ORJSONResponse skips response_model validation, so this keeps
+        optional fields missing from stored documents in the response as
+        null or [] like the model would, nested models included.
+        """
+        defaults, factories, nested = _field_defaults(model)
+        filled = {**defaults, **doc}
+        for name, factory in factories.items():
+            if name not in doc:
+                filled[name] = factory()
+        for name, (nested_model, many) in nested.items():
+            value = filled.get(name)
+            if value is None:
+                continue
+            if many:
+                filled[name] = [DatabaseManager.with_defaults(nested_model, item) for item in value]
+            else:
+                filled[name] = DatabaseManager.with_defaults(nested_model, value)
+        return filled
+
+    @staticmethod
+    async def ensure_indexes():
+        """Create the indexes declared in INDEXES, skipping existing ones.
+
+        Every collection is indexed even when one fails. A unique index that
+        cannot be built because of duplicate keys raises a RuntimeError
+        listing them, once all the collections have been tried.
+        """
+        duplicates = []
+        
+        for collection, indexes in INDEXES.items():
+            try:
+                await db[collection].create_indexes(indexes)
+            except OperationFailure as e:
+                if e.code != 11000:
+                    raise
+                # The indexes of one call are built together or not at all,
+                # so build them one by one to keep those that can be
+                for index in indexes:
+                    try:
+                        await db[collection].create_indexes([index])
+                    except OperationFailure as e:
+                        if e.code != 11000:
+                            raise
+                        duplicates.extend(
+                            f"{collection}: {key}" for key in await _duplicate_keys(collection, index)
+                        )
+        
+        if duplicates:
+            raise RuntimeError(
+                "Unique indexes not built, remove the duplicates first: " + "; ".join(duplicates)
+            )
+
+    @staticmethod
+    async def verify_query_plans():
+        """Explain every query shape and fail if one scans a whole collection"""
+        collection_scans = []
+        
+        for collection, filter_query, sort in QUERY_SHAPES:
+            cursor = db[collection].find(filter_query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = await cursor.explain()
+            if _has_stage(plan["queryPlanner"]["winningPlan"], "COLLSCAN"):
+                collection_scans.append(f"{collection} {filter_query} sort={sort}")
+        
+        if collection_scans:
+            raise RuntimeError(
+                "Collection scans in query plans: " + "; ".join(collection_scans)
+            )
+
+    @staticmethod
+    async def reserve_ids(counter: str, count: int = 1) -> int:
+        """Atomically reserve a block of IDs and return the first one"""
+        result = await db.counters.find_one_and_update(
+            {"_id": counter},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return result["seq"] - count + 1
+
+    @staticmethod
+    async def seed_counters():
+        """Move the counters past the highest IDs already stored"""
+        last_ids = {}
+        
+        last_unit = await db.units.find_one({}, {"id": 1}, sort=[("id", -1)])
+        last_ids["units"] = last_unit["id"] if last_unit else 0
+        
+        last_event = await db.calendar_events.find_one({}, {"id": 1}, sort=[("id", -1)])
+        last_ids["calendar_events"] = last_event["id"] if last_event else 0
+        
+        last_lesson = await db.units.aggregate([
+            {"$unwind": "$lessons"},
+            {"$group": {"_id": None, "id": {"$max": "$lessons.id"}}}
+        ]).to_list(1)
+        last_ids["lessons"] = (last_lesson[0]["id"] or 0) if last_lesson else 0
+        
+        for counter, last_id in last_ids.items():
+            await db.counters.update_one(
+                {"_id": counter},
+                {"$max": {"seq": last_id}},
+                upsert=True
+            )
+
     @staticmethod
     async def init_default_data():
         """Initialize database with default course data"""
@@ -0,0 +1,73 @@
+import asyncio
+import copy
+import functools
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable
+
+from starlette.responses import Response
+
+from utils.database import collection_versions
+
+# Longest a request waits on an identical one before computing its own answer
+MAX_WAIT = float(os.environ.get("SINGLE_FLIGHT_MAX_WAIT", "5"))
+
+# Per handler: executions started, calls that joined one, and joins that gave up waiting
+flight_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"executions": 0, "coalesced": 0, "timeouts": 0})
+
+_in_flight: Dict[Hashable, asyncio.Task] = {}
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _share(result: Any) -> Any:
+    # Middleware appends to the raw headers of the response it sends, so each
+    # request gets its own copy of them
+    if isinstance(result, Response):
+        result = copy.copy(result)
+        result.raw_headers = list(result.raw_headers)
+    return result
+
+def _forget(key: Hashable, task: asyncio.Task):
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+    if not task.cancelled():
+        # Retrieve the exception so a flight nobody awaits any more does not warn
+        task.exception()
+
+def single_flight(handler: Callable) -> Callable:
+    """Let concurrent identical calls of a read handler share one execution.
+
+    Calls are identical when they have the same handler and the same
+    parameters, as parsed by FastAPI. The key also includes the collection
+    versions, so a request made after a write never joins a call started
+    before it. A call waits at most MAX_WAIT seconds for the shared result,
+    then runs the handler itself. Errors, such as HTTPException, reach every
+    caller. Put it under the route decorator.
+    """
+    name = f"{handler.__module__}.{handler.__name__}"
+    stats = flight_stats[name]
+
+    @functools.wraps(handler)
+    async def wrapper(**params):
+        key = (name, sum(collection_versions.values()), _freeze(params))
+        task = _in_flight.get(key)
+        if task is None:
+            stats["executions"] += 1
+            task = asyncio.ensure_future(handler(**params))
+            _in_flight[key] = task
+            task.add_done_callback(functools.partial(_forget, key))
+            return _share(await asyncio.shield(task))
+
+        stats["coalesced"] += 1
+        try:
+            return _share(await asyncio.wait_for(asyncio.shield(task), MAX_WAIT))
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            return await handler(**params)
+
+    return wrapper
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmarks for ICD201 Course Schema API
+Seeds a scratch MongoDB database and measures round trips and latency of the
+backend handlers against the previous implementations
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from bson import ObjectId
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from dotenv import load_dotenv
+
+load_dotenv(BACKEND_DIR / ".env")
+
+# Never run benchmarks against the application database
+os.environ["DB_NAME"] = os.getenv("BENCHMARK_DB_NAME", f"{os.environ['DB_NAME']}_benchmark")
+
+from utils import database
+database.init_database()
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, FileResponse, StreamingResponse
+from pydantic import TypeAdapter
+
+from reportlab import rl_config
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import TableStyle
+
+from models.calendar import CalendarEvent, WeekView
+from models.settings import PDFExportOptions
+from routes import calendar, export
+from services.pdf_generator import PDFGenerator, TABLE_STYLES
+from services.pdf_fragments import unit_fragments
+from services import course_data
+from utils.database import DatabaseManager
+
+ITERATIONS = int(os.getenv("BENCHMARK_ITERATIONS", "20"))
+
+
+class CountingCursor:
+    """Cursor proxy counting one round trip per materialization"""
+
+    def __init__(self, cursor, counter: "CountingDatabase"):
+        self._cursor = cursor
+        self._counter = counter
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, *args, **kwargs):
+        self._cursor = self._cursor.limit(*args, **kwargs)
+        return self
+
+    async def to_list(self, length):
+        await self._counter.round_trip()
+        return await self._cursor.to_list(length)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._counter.round_trip()
+        async for doc in self._cursor:
+            yield doc
+
+
+class CountingCollection:
+    """Collection proxy counting every call that reaches the server"""
+
+    def __init__(self, collection, counter: "CountingDatabase"):
+        self._collection = collection
+        self._counter = counter
+
+    def find(self, *args, **kwargs):
+        return CountingCursor(self._collection.find(*args, **kwargs), self._counter)
+
+    def aggregate(self, *args, **kwargs):
+        return CountingCursor(self._collection.aggregate(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await self._counter.round_trip()
+            return await attr(*args, **kwargs)
+
+        return call
+
+
+class CountingDatabase:
+    """Database proxy counting round trips, with optional injected latency"""
+
+    def __init__(self, db, latency: float = 0.0):
+        self._db = db
+        self.latency = latency
+        self.round_trips = 0
+
+    async def round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name], self)
+
+    def __getattr__(self, name):
+        return CountingCollection(getattr(self._db, name), self)
+
+
+async def legacy_weeks_view(db) -> List[WeekView]:
+    """Previous week view: one query per week"""
+    settings = await db.course_settings.find_one()
+    start_date = datetime.fromisoformat(settings["start_date"])
+    weeks = []
+    for week_num in range(1, settings["total_weeks"] + 1):
+        week_start = start_date + timedelta(weeks=week_num - 1)
+        week_end = week_start + timedelta(days=6)
+        week_events = await db.calendar_events.find({
+            "date": {
+                "$gte": week_start.strftime("%Y-%m-%d"),
+                "$lte": week_end.strftime("%Y-%m-%d")
+            }
+        }).sort("date", 1).to_list(1000)
+        weeks.append(WeekView(
+            week_number=week_num,
+            start_date=week_start.strftime("%Y-%m-%d"),
+            end_date=week_end.strftime("%Y-%m-%d"),
+            events=DatabaseManager.serialize_docs(week_events),
+            total_hours=sum(event.get("duration", 0) for event in week_events)
+        ))
+    return weeks
+
+
+def legacy_pdf_setup():
+    """Previous per-render setup: a fresh stylesheet and new table styles"""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='CustomTitle', parent=styles['Heading1'], fontSize=24))
+    styles.add(ParagraphStyle(name='CustomHeading2', parent=styles['Heading2'], fontSize=16))
+    styles.add(ParagraphStyle(name='CustomHeading3', parent=styles['Heading3'], fontSize=14))
+    return styles, [TableStyle(style.getCommands()) for style in TABLE_STYLES.values()]
+
+
+def sample_course(unit_count: int = 4, lessons_per_unit: int = 6):
+    """Serialized settings, units, resources and events of a synthetic course"""
+    now = datetime.utcnow().isoformat()
+    settings = {
+        "total_hours": 110, "total_weeks": 18, "hours_per_week": 6.1,
+        "start_date": "2025-01-15", "end_date": "2025-05-30",
+        "course_title": "ICD201 - Benchmark", "course_description": "Benchmark",
+        "created_at": now, "updated_at": now
+    }
+    units = [
+        {
+            "id": u, "title": f"Unité {u}", "description": "Description " * 20,
+            "duration": lessons_per_unit * 2, "objectives": [f"Objectif {i}" for i in range(4)],
+            "lessons": [
+                {
+                    "id": u * 100 + i, "title": f"Leçon {u}.{i}", "duration": 2,
+                    "content": "Contenu de la leçon. " * 15, "activities": ["Discussion", "Atelier"],
+                    "resources": ["ordinateurs", "iPad"]
+                }
+                for i in range(1, lessons_per_unit + 1)
+            ],
+            "created_at": now, "updated_at": now
+        }
+        for u in range(1, unit_count + 1)
+    ]
+    resources = [
+        {"id": rid, "name": rid, "quantity": 30, "description": "Ressource", "availability": "Disponible"}
+        for rid in ("ordinateurs", "iPad")
+    ]
+    events = [
+        {
+            "id": i + 1, "title": f"Événement {i + 1}", "unit_id": 1 + i % unit_count, "lesson_id": None,
+            "date": (datetime(2025, 1, 15) + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "duration": 2, "resources": ["ordinateurs"]
+        }
+        for i in range(unit_count * lessons_per_unit)
+    ]
+    return settings, units, resources, events
+
+
+async def legacy_course_data(db, options):
+    """Previous export loading: four sequential queries of whole documents"""
+    settings = await db.course_settings.find_one()
+    if options.selected_units:
+        units = await db.units.find({"id": {"$in": options.selected_units}}).to_list(1000)
+    else:
+        units = await db.units.find().to_list(1000)
+    resources = []
+    if options.include_resources:
+        resources = await db.resources.find().to_list(1000)
+    events = []
+    if options.include_schedule:
+        events = await db.calendar_events.find().sort("date", 1).to_list(1000)
+    return (
+        DatabaseManager.serialize_doc(settings),
+        DatabaseManager.serialize_docs(units),
+        DatabaseManager.serialize_docs(resources),
+        DatabaseManager.serialize_docs(events)
+    )
+
+
+class Benchmark:
+    def __init__(self):
+        self.db = database.db
+        self.results = []
+
+    async def seed(self, total_weeks: int = 40, events_per_week: int = 12):
+        """Seed the scratch database with a long program"""
+        await self.db.course_settings.delete_many({})
+        await self.db.calendar_events.delete_many({})
+        await self.db.course_settings.insert_one({
+            "total_hours": total_weeks * 6,
+            "total_weeks": total_weeks,
+            "hours_per_week": 6,
+            "start_date": "2025-01-15",
+            "end_date": (datetime(2025, 1, 15) + timedelta(weeks=total_weeks)).strftime("%Y-%m-%d"),
+            "course_title": "Benchmark",
+            "course_description": "Benchmark",
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        })
+        events = []
+        for i in range(total_weeks * events_per_week):
+            events.append({
+                "id": i + 1,
+                "title": f"Événement {i + 1}",
+                "unit_id": 1 + i % 4,
+                "lesson_id": None,
+                "date": (datetime(2025, 1, 15) + timedelta(days=i * 7 // events_per_week)).strftime("%Y-%m-%d"),
+                "duration": 1 + i % 4,
+                "resources": ["ordinateurs"] if i % 2 else ["iPad"],
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            })
+        await self.db.calendar_events.insert_many(events)
+
+    async def measure(self, name: str, handler: Callable, latency: float = 0.0) -> Dict[str, Any]:
+        """Run a handler against a counting database and record timings"""
+        counter = CountingDatabase(self.db, latency)
+        timings = []
+        result = None
+        for _ in range(ITERATIONS):
+            counter.round_trips = 0
+            started = time.perf_counter()
+            result = await handler(counter)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        entry = {
+            "name": name,
+            "round_trips": counter.round_trips,
+            "median_ms": timings[len(timings) // 2] * 1000,
+            "result": result
+        }
+        self.results.append(entry)
+        print(f"{name:<45} {entry['round_trips']:>5} round trips  {entry['median_ms']:>9.2f} ms")
+        return entry
+
+    async def bench_weeks_view(self):
+        """Week view: per-week queries vs single range query"""
+        print("\n=== GET /api/calendar/weeks (40 weeks) ===")
+
+        async def current(counter):
+            calendar.db = counter
+            try:
+                return await calendar.get_weeks_view()
+            finally:
+                calendar.db = self.db
+
+        for latency in (0.0, 0.002):
+            label = f"latency {latency * 1000:.0f}ms"
+            before = await self.measure(f"legacy weeks view ({label})", legacy_weeks_view, latency)
+            after = await self.measure(f"bucketed weeks view ({label})", current, latency)
+            after_weeks = [WeekView(**week) for week in json.loads(after["result"].body)]
+            same = [w.dict() for w in before["result"]] == [w.dict() for w in after_weeks]
+            print(f"{'identical response':<45} {'yes' if same else 'NO'}")
+
+    def bench_serialization(self, count: int = 5000):
+        """Event list encoding: serialize_doc + response_model vs projected orjson"""
+        print(f"\n=== JSON encoding of {count} calendar events ===")
+
+        now = datetime.utcnow()
+        documents = [
+            {
+                "_id": ObjectId(),
+                "id": i + 1,
+                "title": f"Événement {i + 1}",
+                "unit_id": 1 + i % 4,
+                "lesson_id": 101 + i % 3,
+                "date": (datetime(2025, 1, 15) + timedelta(days=i % 140)).strftime("%Y-%m-%d"),
+                "duration": 1 + i % 4,
+                "resources": ["ordinateurs", "iPad"],
+                "created_at": now,
+                "updated_at": now
+            }
+            for i in range(count)
+        ]
+        projection = DatabaseManager.projection(CalendarEvent)
+        projected = [
+            {key: value for key, value in doc.items() if key in projection and projection[key]}
+            for doc in documents
+        ]
+        adapter = TypeAdapter(List[CalendarEvent])
+
+        def legacy():
+            # serialize_doc mutates, so work on copies like fresh query results
+            docs = DatabaseManager.serialize_docs([dict(doc) for doc in documents])
+            content = jsonable_encoder(adapter.dump_python(adapter.validate_python(docs), mode="json"))
+            return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+        def fast():
+            return ORJSONResponse([dict(doc) for doc in projected]).body
+
+        for name, encode in (("serialize_doc + response_model", legacy), ("projection + ORJSONResponse", fast)):
+            timings = []
+            for _ in range(ITERATIONS):
+                started = time.perf_counter()
+                body = encode()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"{name:<45} {len(body):>8} bytes  {timings[len(timings) // 2] * 1000:>9.2f} ms")
+
+        same = json.loads(legacy()) == json.loads(fast())
+        print(f"{'identical payload':<45} {'yes' if same else 'NO'}")
+
+    async def bench_pdf_streaming_memory(self, size: int = 32 * 1024 * 1024):
+        """Peak memory while sending a large PDF: buffer copies vs chunked streaming"""
+        print(f"\n=== Streaming a {size // (1024 * 1024)} MiB PDF (tracemalloc peak) ===")
+
+        pdf_bytes = b"%PDF-1.4\n" + os.urandom(size)
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as pdf_file:
+            pdf_file.write(pdf_bytes)
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            pass
+
+        scope = {"type": "http", "method": "GET", "headers": []}
+
+        def legacy():
+            # Render into BytesIO, getvalue() copy, then a second BytesIO
+            buffer = io.BytesIO()
+            buffer.write(pdf_bytes)
+            data = buffer.getvalue()
+            return StreamingResponse(io.BytesIO(data), media_type="application/pdf")
+
+        def cached():
+            return StreamingResponse(export._iter_chunks(pdf_bytes), media_type="application/pdf")
+
+        def rendered():
+            return FileResponse(path, media_type="application/pdf")
+
+        try:
+            for name, make_response in (("BytesIO copies (previous)", legacy),
+                                         ("cache hit, memoryview chunks", cached),
+                                         ("fresh render, file chunks", rendered)):
+                tracemalloc.start()
+                response = make_response()
+                await response(scope, receive, send)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"{name:<45} peak {peak / (1024 * 1024):>8.2f} MiB")
+        finally:
+            os.unlink(path)
+
+    async def bench_course_data_loading(self):
+        """Export data loading: sequential queries vs concurrent projected loader"""
+        print("\n=== Export data loading (settings, units, resources, events) ===")
+
+        settings, units, resources, _ = sample_course(unit_count=12)
+        await self.db.units.delete_many({})
+        await self.db.resources.delete_many({})
+        await self.db.units.insert_many([dict(unit) for unit in units])
+        await self.db.resources.insert_many([dict(resource) for resource in resources])
+        options = PDFExportOptions()
+
+        async def legacy(counter):
+            return await legacy_course_data(counter, options)
+
+        async def current(counter):
+            course_data.db = counter
+            try:
+                return await course_data.load_course_data(options)
+            finally:
+                course_data.db = self.db
+
+        for latency in (0.0, 0.005):
+            label = f"latency {latency * 1000:.0f}ms"
+            await self.measure(f"sequential queries ({label})", legacy, latency)
+            await self.measure(f"concurrent projected loader ({label})", current, latency)
+
+    def bench_pdf_setup(self):
+        """Per-render PDF setup: fresh stylesheet vs shared style registry"""
+        print("\n=== PDF generator setup cost ===")
+
+        PDFGenerator()
+        settings, units, resources, events = sample_course()
+        options = PDFExportOptions()
+
+        for name, setup in (("fresh styles per render (previous)", legacy_pdf_setup),
+                            ("shared style registry", PDFGenerator)):
+            timings = []
+            for _ in range(ITERATIONS * 10):
+                started = time.perf_counter()
+                setup()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"{name:<45} {timings[len(timings) // 2] * 1000:>9.3f} ms")
+
+        timings = []
+        for _ in range(ITERATIONS):
+            started = time.perf_counter()
+            PDFGenerator().generate_course_pdf(settings, units, resources, events, options)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f"{'full render, 4 units':<45} {timings[len(timings) // 2] * 1000:>9.3f} ms")
+
+    def bench_pdf_fragments(self, unit_count: int = 40):
+        """Re-export after editing one unit: full rebuild vs cached unit fragments"""
+        print(f"\n=== PDF re-export after editing one of {unit_count} units ===")
+
+        settings, units, resources, events = sample_course(unit_count)
+        options = PDFExportOptions()
+        generator = PDFGenerator()
+
+        def edit_unit(i):
+            unit = units[i % unit_count]
+            unit["title"] = f"Unité {unit['id']} (révision {i})"
+            unit["updated_at"] = (datetime.utcnow() + timedelta(seconds=i)).isoformat()
+
+        def full():
+            unit_fragments.clear()
+            return generator.generate_course_pdf(settings, units, resources, events, options)
+
+        def incremental():
+            return generator.generate_course_pdf(settings, units, resources, events, options)
+
+        incremental()
+        for name, render in (("rebuild every unit (previous)", full), ("cached unit fragments", incremental)):
+            timings = []
+            for i in range(ITERATIONS):
+                edit_unit(i)
+                started = time.perf_counter()
+                render()
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"{name:<45} {timings[len(timings) // 2] * 1000:>9.2f} ms")
+
+        # Deterministic output so both documents can be compared byte for byte
+        rl_config.invariant = 1
+        try:
+            incremental()
+            edit_unit(ITERATIONS)
+            assembled = incremental()
+            rebuilt = full()
+        finally:
+            rl_config.invariant = 0
+        print(f"{'identical PDF':<45} {'yes' if assembled == rebuilt else 'NO'}")
+
+
+async def main():
+    """Run all benchmarks"""
+    print("Starting ICD201 Course Schema API Benchmarks...")
+    print(f"Scratch database: {os.environ['DB_NAME']}")
+
+    benchmark = Benchmark()
+    await benchmark.seed()
+    await benchmark.bench_weeks_view()
+    benchmark.bench_serialization()
+    await benchmark.bench_pdf_streaming_memory()
+    await benchmark.bench_course_data_loading()
+    benchmark.bench_pdf_setup()
+    benchmark.bench_pdf_fragments()
+    await database.client.drop_database(os.environ["DB_NAME"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -89,6 +89,15 @@ class APITester:
             self.log_result("GET /units - Fetch all units", False, f"Status: {status}, Response: {units_data}")
             return False
         
+        # Test conditional GET of the unit list
+        async with self.session.get(f"{API_BASE}/units/") as response:
+            etag = response.headers.get("ETag")
+        if etag:
+            async with self.session.get(f"{API_BASE}/units/", headers={"If-None-Match": etag}) as response:
+                self.log_result("GET /units - If-None-Match", response.status == 304, f"Status: {response.status}")
+        else:
+            self.log_result("GET /units - If-None-Match", False, "No ETag header")
+        
         # Test GET specific unit
         if units_data:
             unit_id = units_data[0]['id']
@@ -220,6 +229,21 @@ class APITester:
                 self.log_result(f"GET /resources/{new_resource_data['id']}/usage - Resource usage stats", False, f"Status: {status}")
         else:
             self.log_result("POST /resources - Create new resource", False, f"Status: {status}, Response: {created_resource}")
+        
+        # Test usage of all resources
+        success, usage_data, status = await self.make_request('GET', f"{API_BASE}/resources/usage")
+        if success and isinstance(usage_data, list):
+            self.log_result("GET /resources/usage - All resources usage", True, f"Usage of {len(usage_data)} resources")
+        else:
+            self.log_result("GET /resources/usage - All resources usage", False, f"Status: {status}")
+        
+        # Test resource heatmap
+        success, heatmap_data, status = await self.make_request('GET', f"{API_BASE}/resources/heatmap?granularity=week")
+        if success and isinstance(heatmap_data, dict) and "resources" in heatmap_data:
+            self.log_result("GET /resources/heatmap - Resource heatmap", True,
+                          f"{len(heatmap_data['resources'])} resources over {heatmap_data.get('periods')} weeks")
+        else:
+            self.log_result("GET /resources/heatmap - Resource heatmap", False, f"Status: {status}")
     
     async def test_calendar_operations(self):
         """Test Calendar Events operations"""
@@ -256,6 +280,20 @@ class APITester:
         else:
             self.log_result("POST /calendar/events - Create new event", False, f"Status: {status}, Response: {created_event}")
         
+        # Test bulk event creation with one invalid item
+        bulk_events_data = [
+            {"title": "Atelier CAO - Groupe A", "unit_id": 2, "date": future_date, "duration": 2, "resources": ["ordinateurs"]},
+            {"title": "Atelier CAO - Groupe B", "unit_id": 2, "date": future_date, "duration": 2, "resources": ["ordinateurs"]},
+            {"title": "Unité inexistante", "unit_id": 999, "date": future_date, "duration": 2, "resources": []}
+        ]
+        
+        success, bulk_result, status = await self.make_request('POST', f"{API_BASE}/calendar/events/bulk", bulk_events_data)
+        if success and isinstance(bulk_result, dict) and len(bulk_result.get('created', [])) == 2 and len(bulk_result.get('errors', [])) == 1:
+            created_ids = [event['id'] for event in bulk_result['created']]
+            self.log_result("POST /calendar/events/bulk - Bulk create events", True, f"Created events {created_ids}, 1 rejected")
+        else:
+            self.log_result("POST /calendar/events/bulk - Bulk create events", False, f"Status: {status}, Response: {bulk_result}")
+        
         # Test weeks view
         success, weeks_data, status = await self.make_request('GET', f"{API_BASE}/calendar/weeks")
         if success and isinstance(weeks_data, list):
@@ -269,6 +307,147 @@ class APITester:
         else:
             self.log_result("GET /calendar/weeks - Weeks view", False, f"Status: {status}")
     
+    async def test_events_pagination(self):
+        """Test keyset pagination of calendar events"""
+        print("\n=== Testing Events Pagination ===")
+        
+        # Several events on the same date, so pages split within a date
+        first_date = (datetime.now() + timedelta(days=500)).strftime("%Y-%m-%d")
+        second_date = (datetime.now() + timedelta(days=501)).strftime("%Y-%m-%d")
+        events_data = [
+            {"title": f"Séance de pagination {index}", "unit_id": 2, "date": date, "duration": 1, "resources": []}
+            for index, date in enumerate([first_date] * 5 + [second_date] * 2)
+        ]
+        success, bulk_result, status = await self.make_request('POST', f"{API_BASE}/calendar/events/bulk", events_data)
+        if not success or len(bulk_result.get('created', [])) != len(events_data):
+            self.log_result("GET /calendar/events - Setup pagination events", False, f"Status: {status}, Response: {bulk_result}")
+            return
+        created_ids = sorted(event['id'] for event in bulk_result['created'])
+        
+        # Walk the pages until no next cursor is returned
+        url = f"{API_BASE}/calendar/events?start={first_date}&end={second_date}&limit=2"
+        pages, cursor = [], None
+        while len(pages) <= len(events_data):
+            page_url = f"{url}&cursor={cursor}" if cursor else url
+            async with self.session.get(page_url) as response:
+                page = await response.json() if response.status == 200 else None
+                cursor = response.headers.get("X-Next-Cursor")
+            if page is None:
+                break
+            pages.append(page)
+            if not cursor:
+                break
+        
+        seen_ids = [event['id'] for page in pages for event in page]
+        ordered = [(event['date'], event['id']) for page in pages for event in page]
+        if seen_ids and sorted(seen_ids) == created_ids and ordered == sorted(ordered) and not cursor:
+            self.log_result("GET /calendar/events - Keyset pagination", True,
+                          f"{len(seen_ids)} events in {len(pages)} pages, no duplicates or gaps")
+        else:
+            self.log_result("GET /calendar/events - Keyset pagination", False,
+                          f"Pages: {[[event['id'] for event in page] for page in pages]}, expected {created_ids}")
+        
+        # The last page is full but has no next cursor
+        async with self.session.get(f"{API_BASE}/calendar/events?start={second_date}&end={second_date}&limit=2") as response:
+            last_page = await response.json()
+            if response.status == 200 and len(last_page) == 2 and "X-Next-Cursor" not in response.headers:
+                self.log_result("GET /calendar/events - Last page cursor", True, "No X-Next-Cursor on the last page")
+            else:
+                self.log_result("GET /calendar/events - Last page cursor", False, f"Status: {response.status}, Headers: {dict(response.headers)}")
+        
+        success, data, status = await self.make_request('GET', f"{API_BASE}/calendar/events?limit=2&cursor=not-a-cursor")
+        if status == 400:
+            self.log_result("GET /calendar/events - Invalid cursor", True, "Proper 400 response")
+        else:
+            self.log_result("GET /calendar/events - Invalid cursor", False, f"Expected 400, got {status}")
+        
+        for event_id in created_ids:
+            await self.make_request('DELETE', f"{API_BASE}/calendar/events/{event_id}")
+    
+    async def test_conflict_check(self):
+        """Test the conflict check of a booking against resource capacity"""
+        print("\n=== Testing Conflict Check ===")
+        
+        # Fill the three 3D printers on a day far from the course
+        check_date = (datetime.now() + timedelta(days=400)).strftime("%Y-%m-%d")
+        bookings = [
+            {"title": f"Impression 3D - Groupe {group}", "unit_id": 2, "date": check_date, "duration": 2, "resources": ["imprimantes3D"]}
+            for group in "ABC"
+        ]
+        success, bulk_result, status = await self.make_request('POST', f"{API_BASE}/calendar/events/bulk", bookings)
+        if not success or len(bulk_result.get('created', [])) != 3:
+            self.log_result("POST /calendar/conflicts/check - Setup bookings", False, f"Status: {status}, Response: {bulk_result}")
+            return
+        event_ids = sorted(event['id'] for event in bulk_result['created'])
+        
+        check = {"date": check_date, "resources": ["imprimantes3D", "ordinateurs"]}
+        success, result, status = await self.make_request('POST', f"{API_BASE}/calendar/conflicts/check", check)
+        conflicts = result.get('conflicts', []) if isinstance(result, dict) else []
+        if (success and result.get('has_conflicts') and len(conflicts) == 1
+                and conflicts[0]['resource_id'] == "imprimantes3D" and conflicts[0]['peak_demand'] == 4
+                and conflicts[0]['event_ids'] == event_ids):
+            self.log_result("POST /calendar/conflicts/check - Over capacity", True, f"Conflict with events {event_ids}")
+        else:
+            self.log_result("POST /calendar/conflicts/check - Over capacity", False, f"Status: {status}, Response: {result}")
+        
+        # Moving one of the bookings does not conflict with itself
+        success, result, status = await self.make_request(
+            'POST', f"{API_BASE}/calendar/conflicts/check", dict(check, event_id=event_ids[0])
+        )
+        if success and result == {"has_conflicts": False, "conflicts": []}:
+            self.log_result("POST /calendar/conflicts/check - Moved event", True, "No conflict")
+        else:
+            self.log_result("POST /calendar/conflicts/check - Moved event", False, f"Status: {status}, Response: {result}")
+        
+        for event_id in event_ids:
+            await self.make_request('DELETE', f"{API_BASE}/calendar/events/{event_id}")
+    
+    async def test_course_snapshot(self):
+        """Test the course snapshot with field selection and conditional GET"""
+        print("\n=== Testing Course Snapshot ===")
+        
+        # Test full snapshot
+        success, snapshot, status = await self.make_request('GET', f"{API_BASE}/course/snapshot")
+        sections = ['settings', 'units', 'resources', 'events', 'usage']
+        if success and isinstance(snapshot, dict) and sorted(snapshot) == sorted(sections):
+            self.log_result("GET /course/snapshot - Full snapshot", True, f"{len(snapshot['units'])} units, {len(snapshot['events'])} events")
+        else:
+            self.log_result("GET /course/snapshot - Full snapshot", False, f"Status: {status}, Response: {snapshot}")
+        
+        # Test field selection
+        success, snapshot, status = await self.make_request('GET', f"{API_BASE}/course/snapshot?fields=units.id,units.title,settings")
+        if (success and isinstance(snapshot, dict) and sorted(snapshot) == ['settings', 'units']
+                and snapshot['units'] and all(sorted(unit) == ['id', 'title'] for unit in snapshot['units'])
+                and 'course_title' in snapshot['settings']):
+            self.log_result("GET /course/snapshot - Field selection", True, "Only units.id, units.title and settings returned")
+        else:
+            self.log_result("GET /course/snapshot - Field selection", False, f"Status: {status}, Response: {snapshot}")
+        
+        # Test unknown sections and fields
+        for fields in ('grades', 'units.grade'):
+            success, data, status = await self.make_request('GET', f"{API_BASE}/course/snapshot?fields={fields}")
+            if status == 400:
+                self.log_result(f"GET /course/snapshot?fields={fields} - Unknown field", True, "Proper 400 response")
+            else:
+                self.log_result(f"GET /course/snapshot?fields={fields} - Unknown field", False, f"Expected 400, got {status}")
+        
+        # Test ETag / If-None-Match round trip
+        url = f"{API_BASE}/course/snapshot?fields=settings"
+        async with self.session.get(url) as response:
+            etag = response.headers.get("ETag")
+        if not etag:
+            self.log_result("GET /course/snapshot - If-None-Match", False, "No ETag header")
+            return
+        async with self.session.get(url, headers={"If-None-Match": etag}) as response:
+            self.log_result("GET /course/snapshot - If-None-Match", response.status == 304, f"Status: {response.status}")
+        
+        # A write to a selected section changes the ETag
+        success, settings_data, status = await self.make_request('GET', f"{API_BASE}/settings/")
+        await self.make_request('PUT', f"{API_BASE}/settings/", {"course_title": settings_data.get('course_title', '')})
+        async with self.session.get(url, headers={"If-None-Match": etag}) as response:
+            changed = response.status == 200 and response.headers.get("ETag") != etag
+            self.log_result("GET /course/snapshot - ETag after write", changed, f"Status: {response.status}")
+    
     async def test_settings_operations(self):
         """Test Settings operations"""
         print("\n=== Testing Settings Operations ===")
@@ -328,6 +507,51 @@ class APITester:
                 self.log_result("Export preview data structure validation", False, "Missing required sections")
         else:
             self.log_result("POST /export/preview - PDF preview", False, f"Status: {status}, Response: {preview_data}")
+        
+        # Test background export job
+        success, job_data, status = await self.make_request('POST', f"{API_BASE}/export/jobs", export_options)
+        if success and isinstance(job_data, dict) and job_data.get('status') == 'queued':
+            job_id = job_data['id']
+            self.log_result("POST /export/jobs - Queue export job", True, f"Queued job {job_id}")
+            
+            for _ in range(60):
+                await asyncio.sleep(1)
+                success, job_data, status = await self.make_request('GET', f"{API_BASE}/export/jobs/{job_id}")
+                if not success or job_data.get('status') in ('done', 'failed'):
+                    break
+            
+            if success and job_data.get('status') == 'done':
+                self.log_result(f"GET /export/jobs/{job_id} - Export job status", True, f"Progress: {job_data.get('progress')}")
+                
+                async with self.session.get(f"{API_BASE}/export/jobs/{job_id}/file") as response:
+                    content = await response.read()
+                    if response.status == 200 and content.startswith(b'%PDF'):
+                        self.log_result(f"GET /export/jobs/{job_id}/file - Download export", True, f"Downloaded {len(content)} bytes")
+                    else:
+                        self.log_result(f"GET /export/jobs/{job_id}/file - Download export", False, f"Status: {response.status}")
+            else:
+                self.log_result(f"GET /export/jobs/{job_id} - Export job status", False, f"Status: {status}, Response: {job_data}")
+        else:
+            self.log_result("POST /export/jobs - Queue export job", False, f"Status: {status}, Response: {job_data}")
+        
+        # Test tabular exports
+        for export_format in ('csv', 'jsonl', 'html', 'xlsx'):
+            url = f"{API_BASE}/export/tables/lessons/{export_format}"
+            async with self.session.post(url, json={"selected_units": [1]}) as response:
+                content = await response.read()
+                if response.status == 200 and content:
+                    self.log_result(f"POST /export/tables/lessons/{export_format} - Tabular export", True, f"Downloaded {len(content)} bytes")
+                else:
+                    self.log_result(f"POST /export/tables/lessons/{export_format} - Tabular export", False, f"Status: {response.status}")
+        
+        # Test batch export
+        variants = [{"detail_level": "summary"}, {"detail_level": "detailed", "selected_units": [1]}]
+        async with self.session.post(f"{API_BASE}/export/batch", json=variants) as response:
+            content = await response.read()
+            if response.status == 200 and content.startswith(b'PK'):
+                self.log_result("POST /export/batch - Batch export", True, f"Downloaded {len(content)} bytes")
+            else:
+                self.log_result("POST /export/batch - Batch export", False, f"Status: {response.status}")
     
     async def test_error_handling(self):
         """Test API error handling"""
@@ -398,6 +622,9 @@ async def main():
             await tester.test_units_crud()
             await tester.test_resources_crud()
             await tester.test_calendar_operations()
+            await tester.test_events_pagination()
+            await tester.test_conflict_check()
+            await tester.test_course_snapshot()
             await tester.test_settings_operations()
             await tester.test_export_preview()
             await tester.test_error_handling()
@@ -0,0 +1,128 @@
+"""
+Fixtures running the ICD201 API in-process against a scratch MongoDB database.
+
+Set TEST_MONGO_URL to a server the tests may create databases on, or put a
+mongod binary on PATH to have a throwaway single-node replica set started.
+Tests needing a database are skipped when neither is available, and tests
+needing change streams when TEST_MONGO_URL is not a replica set.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+MONGOD_PORT = None if TEST_MONGO_URL else _free_port()
+
+# The routes bind the database when they are imported, which the Motor client
+# allows before the server is up since it only connects on first use
+os.environ["MONGO_URL"] = TEST_MONGO_URL or f"mongodb://127.0.0.1:{MONGOD_PORT}/?directConnection=true"
+os.environ["DB_NAME"] = f"icd201_test_{uuid.uuid4().hex[:8]}"
+os.environ.setdefault("PDF_RENDER_WORKERS", "1")
+import server as server_module
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def _hello(url: str) -> dict:
+    with MongoClient(url, serverSelectionTimeoutMS=500) as client:
+        return client.admin.command("hello")
+
+def _wait_for_server(url: str, primary: bool = False, timeout: float = 30):
+    """Wait until the server answers, and until it is the primary when asked"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if _hello(url).get("isWritablePrimary") or not primary:
+                return
+        except PyMongoError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"MongoDB at {url} is not ready")
+        time.sleep(0.1)
+
+@pytest.fixture(scope="session")
+def mongo_url():
+    """URL of the MongoDB server of the test session"""
+    if TEST_MONGO_URL:
+        yield TEST_MONGO_URL
+        return
+
+    mongod = shutil.which("mongod")
+    if mongod is None:
+        pytest.skip("needs TEST_MONGO_URL or a mongod binary on PATH")
+
+    with tempfile.TemporaryDirectory() as dbpath:
+        process = subprocess.Popen(
+            [mongod, "--dbpath", dbpath, "--port", str(MONGOD_PORT), "--bind_ip", "127.0.0.1", "--replSet", "rs0"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            url = os.environ["MONGO_URL"]
+            _wait_for_server(url)
+            with MongoClient(url) as client:
+                client.admin.command("replSetInitiate", {
+                    "_id": "rs0", "members": [{"_id": 0, "host": f"127.0.0.1:{MONGOD_PORT}"}]
+                })
+            _wait_for_server(url, primary=True)
+            yield url
+        finally:
+            process.terminate()
+            process.wait(30)
+
+@pytest.fixture(scope="session")
+def server(mongo_url):
+    """The server module, its scratch database dropped after the session"""
+    yield server_module
+    with MongoClient(mongo_url) as client:
+        client.drop_database(os.environ["DB_NAME"])
+
+@pytest.fixture(scope="session")
+def replica_set(mongo_url):
+    """Skips tests needing change streams unless the server is a replica set"""
+    if "setName" not in _hello(mongo_url):
+        pytest.skip("needs a replica set for change streams")
+
+@pytest.fixture
+async def database(server):
+    """The scratch database, emptied, with the in-process caches cleared"""
+    from utils import database
+    from services.occupancy_index import occupancy_index
+    from services.pdf_cache import pdf_cache
+    from services.pdf_fragments import unit_fragments
+
+    for name in await database.db.list_collection_names():
+        await database.db.drop_collection(name)
+    database.read_cache.clear()
+    pdf_cache.clear()
+    unit_fragments.clear()
+    occupancy_index.ready = False
+    return database.db
+
+@pytest.fixture
+async def api(server, database):
+    """HTTP client of the app, started on a freshly seeded database"""
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+from services.occupancy_index import occupancy_index
+
+pytestmark = pytest.mark.anyio
+
+def bulk_event(title, date="2025-04-08", resources=("ordinateurs",)):
+    return {"title": title, "unit_id": 2, "date": date, "duration": 1, "resources": list(resources)}
+
+async def test_bulk_create_reports_rejected_inserts(api, database):
+    response = await api.post("/api/calendar/events/bulk", json=[bulk_event("Première")])
+    first_id = response.json()["created"][0]["id"]
+
+    # An event already holding the ID the next block hands to its second item
+    now = datetime.utcnow()
+    await database.calendar_events.insert_one({
+        **bulk_event("Existante", date="2025-04-09"), "id": first_id + 2, "created_at": now, "updated_at": now
+    })
+
+    response = await api.post("/api/calendar/events/bulk", json=[
+        bulk_event("Valide"), bulk_event("Inconnue", resources=["inconnue"]),
+        bulk_event("En double"), bulk_event("Dernière")
+    ])
+    assert response.status_code == 200
+    result = response.json()
+    assert [event["title"] for event in result["created"]] == ["Valide", "Dernière"]
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+    assert result["errors"][1]["detail"] == f"Event {first_id + 2} already exists"
+
+    # Only the inserted events are indexed and visible
+    booked = occupancy_index.bookings("ordinateurs", "2025-04-08")
+    assert {event["id"] for event in result["created"]} <= booked
+    assert first_id + 2 not in booked
+    events = (await api.get("/api/calendar/events", params={"start": "2025-04-08", "end": "2025-04-08"})).json()
+    assert sorted(event["title"] for event in events) == ["Dernière", "Première", "Valide"]
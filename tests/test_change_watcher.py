@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+from bson import ObjectId
+
+from services import change_watcher as change_watcher_module
+from services.change_watcher import ChangeWatcher, change_watcher
+from services.occupancy_index import OccupancyIndex, occupancy_index
+from utils.database import collection_versions
+
+pytestmark = pytest.mark.anyio
+
+DAY = "2025-03-04"
+
+async def no_rebuild(db):
+    raise AssertionError("the occupancy index was rebuilt")
+
+def change(operation, event, **fields):
+    return dict(
+        {"operationType": operation, "ns": {"db": "icd201", "coll": "calendar_events"}, "documentKey": {"_id": event["_id"]}},
+        **fields
+    )
+
+async def test_calendar_changes_are_applied_one_by_one(monkeypatch):
+    index = OccupancyIndex()
+    monkeypatch.setattr(change_watcher_module, "occupancy_index", index)
+    monkeypatch.setattr(index, "rebuild", no_rebuild)
+    watcher = ChangeWatcher()
+    event = {"_id": ObjectId(), "id": 7, "unit_id": 2, "title": "Atelier", "date": DAY, "resources": ["imprimantes3D"]}
+    version = collection_versions["calendar_events"]
+
+    watcher.apply(change("insert", event, fullDocument=event))
+    assert index.bookings("imprimantes3D", DAY) == {7}
+    assert collection_versions["calendar_events"] == version + 1
+
+    # A change the index already holds, such as a write of this worker
+    watcher.apply(change("update", event, fullDocument=dict(event, title="Atelier 3D")))
+    assert watcher.stats()["index_changes_skipped"] == 1
+
+    moved = dict(event, date="2025-03-05")
+    watcher.apply(change("update", moved, fullDocument=moved))
+    assert index.bookings("imprimantes3D", DAY) == set()
+    assert index.bookings("imprimantes3D", "2025-03-05") == {7}
+
+    # Updated then deleted before the stream looked the document up
+    watcher.apply(change("update", event, fullDocument=None))
+    watcher.apply(change("delete", event))
+    assert index.bookings("imprimantes3D", "2025-03-05") == set()
+    watcher.apply(change("delete", event))
+
+    assert watcher.stats()["index_changes_applied"] == 3
+    assert watcher.stats()["index_changes_skipped"] == 3
+    assert collection_versions["calendar_events"] == version + 6
+
+async def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the change stream"
+        await asyncio.sleep(0.05)
+
+async def test_writes_of_other_workers_reach_the_index(replica_set, api, database, monkeypatch):
+    await wait_for(lambda: change_watcher.mode == "change_stream")
+    monkeypatch.setattr(occupancy_index, "rebuild", no_rebuild)
+    etag = (await api.get("/api/calendar/events")).headers["ETag"]
+
+    # Written straight to Mongo, as another worker would
+    event = {"id": 9001, "unit_id": 2, "title": "Atelier", "date": DAY, "resources": ["imprimantes3D"]}
+    await database.calendar_events.insert_one(event)
+    await wait_for(lambda: occupancy_index.bookings("imprimantes3D", DAY) == {9001})
+    response = await api.get("/api/calendar/events", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    await database.calendar_events.update_one({"id": 9001}, {"$set": {"date": "2025-03-05"}})
+    await wait_for(lambda: occupancy_index.bookings("imprimantes3D", "2025-03-05") == {9001})
+
+    await database.calendar_events.delete_one({"id": 9001})
+    await wait_for(lambda: not occupancy_index.bookings("imprimantes3D", "2025-03-05"))
+
+    # A write of this worker is usually in the index before its change arrives
+    # and then skipped; either way it is handled once, without a rebuild
+    def handled():
+        stats = change_watcher.stats()
+        return stats["index_changes_applied"] + stats["index_changes_skipped"]
+
+    before = handled()
+    response = await api.post("/api/calendar/events", json={
+        "title": "Atelier", "unit_id": 2, "date": DAY, "duration": 2, "resources": ["imprimantes3D"]
+    })
+    assert response.status_code == 200
+    await wait_for(lambda: handled() == before + 1)
+    assert occupancy_index.bookings("imprimantes3D", DAY) == {response.json()["id"]}
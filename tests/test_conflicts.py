@@ -0,0 +1,46 @@
+import pytest
+
+from routes import calendar as calendar_routes
+from services.occupancy_index import OccupancyIndex
+
+pytestmark = pytest.mark.anyio
+
+DAY = "2025-03-04"
+
+async def book_printers(api, count):
+    """Book the 3D printers, which have a capacity of 3, count times on DAY"""
+    response = await api.post("/api/calendar/events/bulk", json=[
+        {"title": f"Impression {i}", "unit_id": 2, "date": DAY, "duration": 2, "resources": ["imprimantes3D"]}
+        for i in range(count)
+    ])
+    assert response.status_code == 200
+    return [event["id"] for event in response.json()["created"]]
+
+@pytest.mark.parametrize("indexed", [True, False], ids=["occupancy index", "one-day fallback"])
+async def test_conflict_check(api, monkeypatch, indexed):
+    event_ids = await book_printers(api, 3)
+    if not indexed:
+        # An index that was never built makes the route load the day from Mongo
+        monkeypatch.setattr(calendar_routes, "occupancy_index", OccupancyIndex())
+
+    check = {"date": DAY, "resources": ["imprimantes3D", "ordinateurs"]}
+    response = await api.post("/api/calendar/conflicts/check", json=check)
+    assert response.status_code == 200
+    assert response.json() == {
+        "has_conflicts": True,
+        "conflicts": [{
+            "date": DAY,
+            "resource_id": "imprimantes3D",
+            "resource_name": "Imprimantes 3D",
+            "capacity": 3,
+            "peak_demand": 4,
+            "event_ids": sorted(event_ids)
+        }]
+    }
+
+    # Moving one of the bookings is checked without its own slot
+    response = await api.post("/api/calendar/conflicts/check", json=dict(check, event_id=event_ids[0]))
+    assert response.json() == {"has_conflicts": False, "conflicts": []}
+
+    response = await api.post("/api/calendar/conflicts/check", json=dict(check, date="2025-03-05"))
+    assert response.json() == {"has_conflicts": False, "conflicts": []}
@@ -0,0 +1,59 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_snapshot_field_selection(api):
+    response = await api.get("/api/course/snapshot", params={"fields": "units.id,units.lessons.id,settings"})
+    assert response.status_code == 200
+    snapshot = response.json()
+    assert sorted(snapshot) == ["settings", "units"]
+    assert snapshot["settings"]["course_title"]
+    assert snapshot["units"]
+    for unit in snapshot["units"]:
+        assert sorted(unit) == ["id", "lessons"]
+        assert all(list(lesson) == ["id"] for lesson in unit["lessons"])
+
+    response = await api.get("/api/course/snapshot")
+    assert sorted(response.json()) == ["events", "resources", "settings", "units", "usage"]
+
+async def test_snapshot_overlapping_fields(api):
+    # A parent field already covers its children, Mongo would reject both as a path collision
+    response = await api.get("/api/course/snapshot", params={"fields": "units.lessons,units.lessons.id,units.id"})
+    assert response.status_code == 200
+    expected = await api.get("/api/course/snapshot", params={"fields": "units.id,units.lessons"})
+    assert response.json() == expected.json()
+    assert any(len(lesson) > 1 for unit in response.json()["units"] for lesson in unit["lessons"])
+
+@pytest.mark.parametrize("fields", ["grades", "units.grade", "settings,events.room"])
+async def test_snapshot_rejects_unknown_fields(api, fields):
+    response = await api.get("/api/course/snapshot", params={"fields": fields})
+    assert response.status_code == 400
+
+async def test_snapshot_conditional_get(api):
+    params = {"fields": "settings,units.title"}
+    response = await api.get("/api/course/snapshot", params=params, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    etag = response.headers["ETag"]
+
+    response = await api.get("/api/course/snapshot", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    # Other selections and encodings are other representations
+    response = await api.get("/api/course/snapshot", params={"fields": "settings"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    response = await api.get("/api/course/snapshot", params=params,
+                             headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+
+    # Writes to a section outside the selection keep the ETag, writes inside change it
+    await api.put("/api/resources/ordinateurs", json={"quantity": 30})
+    response = await api.get("/api/course/snapshot", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    await api.put("/api/units/1", json={"title": "Fondements du numérique"})
+    response = await api.get("/api/course/snapshot", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert {"title": "Fondements du numérique"} in response.json()["units"]
@@ -0,0 +1,127 @@
+import asyncio
+import tracemalloc
+
+import orjson
+import pytest
+
+from routes import export
+from services.pdf_cache import PDFCache
+from services.pdf_pool import pdf_render_pool
+
+pytestmark = pytest.mark.anyio
+
+PDF_SIZE = 16 * 1024 * 1024
+MiB = 1024 * 1024
+
+async def render_large_pdf(path, **course):
+    """Stand-in for the render pool writing a PDF much larger than a stream chunk"""
+    block = b"0" * MiB
+    with open(path, "wb") as output:
+        output.write(b"%PDF-1.4\n")
+        for _ in range(PDF_SIZE // MiB):
+            output.write(block)
+    return PDF_SIZE + 9
+
+async def stream_export(app, options):
+    """POST /api/export/pdf through the ASGI app, dropping each chunk once received.
+
+    Returns the status, the body size, the largest chunk and the peak of
+    memory allocated during the request.
+    """
+    request = orjson.dumps(options)
+    received = {"status": None, "size": 0, "largest_chunk": 0, "start": b""}
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": request, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            received["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            received["start"] = received["start"] or chunk[:5]
+            received["size"] += len(chunk)
+            received["largest_chunk"] = max(received["largest_chunk"], len(chunk))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/api/export/pdf", "raw_path": b"/api/export/pdf",
+        "root_path": "", "query_string": b"", "client": ("test", 1), "server": ("test", 80),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(request)).encode())],
+    }
+
+    tracemalloc.start()
+    try:
+        await app(scope, receive, send)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return received, peak
+
+async def test_export_pdf_streams_in_bounded_memory(server, api, monkeypatch):
+    monkeypatch.setattr(pdf_render_pool, "render_to_file", render_large_pdf)
+    options = {"detail_level": "summary"}
+
+    # A fresh render is streamed from its file and cached on disk, never read whole
+    received, peak = await stream_export(server.app, options)
+    assert received["status"] == 200
+    assert received["start"] == b"%PDF-"
+    assert received["size"] == PDF_SIZE + 9
+    assert received["largest_chunk"] <= export.CHUNK_SIZE
+    assert peak < 4 * MiB
+
+    # A cache hit is streamed from the cached file
+    received, peak = await stream_export(server.app, options)
+    assert received["status"] == 200
+    assert received["size"] == PDF_SIZE + 9
+    assert received["largest_chunk"] <= export.CHUNK_SIZE
+    assert peak < 4 * MiB
+
+async def test_unrelated_writes_keep_cached_pdfs(api, monkeypatch):
+    renders = []
+
+    async def render(path, **course):
+        renders.append(course)
+        return await render_large_pdf(path, **course)
+
+    monkeypatch.setattr(pdf_render_pool, "render_to_file", render)
+    options = {"detail_level": "summary", "include_schedule": False}
+
+    assert (await api.post("/api/export/pdf", json=options)).status_code == 200
+    # The export leaves the schedule out, so a new event does not change its key
+    response = await api.post("/api/calendar/events", json={
+        "date": "2025-03-03", "title": "Atelier", "duration": 2, "unit_id": 1
+    })
+    assert response.status_code == 200
+    assert (await api.post("/api/export/pdf", json=options)).status_code == 200
+    assert len(renders) == 1
+
+    await api.put("/api/units/1", json={"title": "Fondements du numérique"})
+    assert (await api.post("/api/export/pdf", json=options)).status_code == 200
+    assert len(renders) == 2
+
+def test_pdf_cache_keeps_large_entries_on_disk(tmp_path):
+    cache = PDFCache(max_entries=2, max_bytes=8 * MiB, max_memory_entry=MiB)
+    small = tmp_path / "small.pdf"
+    small.write_bytes(b"%PDF-small")
+    large = tmp_path / "large.pdf"
+    large.write_bytes(b"%PDF-" + b"0" * (2 * MiB))
+
+    cache.put_file("small", str(small))
+    cache.put_file("large", str(large))
+    assert cache.get("small") == b"%PDF-small"
+    with cache.get("large") as cached:
+        assert cached.read() == large.read_bytes()
+
+    # An open file outlives the eviction of its entry
+    cached = cache.get("large")
+    cache.put_file("other", str(small))
+    cache.put_file("another", str(small))
+    assert cache.get("large") is None
+    with cached:
+        assert cached.read(5) == b"%PDF-"
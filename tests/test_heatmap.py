@@ -0,0 +1,48 @@
+import io
+
+import numpy as np
+import pytest
+
+from routes import resources as resource_routes
+from services.occupancy_index import OccupancyIndex
+
+pytestmark = pytest.mark.anyio
+
+RANGE = {"start": "2025-03-03", "end": "2025-03-16"}
+
+async def book(api, date, resources):
+    response = await api.post("/api/calendar/events", json={
+        "title": "Atelier", "unit_id": 2, "date": date, "duration": 2, "resources": resources
+    })
+    assert response.status_code == 200
+
+@pytest.fixture
+async def bookings(api, database):
+    for _ in range(4):
+        await book(api, "2025-03-04", ["imprimantes3D", "ordinateurs"])
+    await book(api, "2025-03-11", ["imprimantes3D"])
+    # Outside the range, and a malformed date written around the API
+    await book(api, "2025-04-01", ["imprimantes3D"])
+    await database.calendar_events.insert_one({"id": 999, "date": "2025-03", "resources": ["imprimantes3D"]})
+
+@pytest.mark.parametrize("indexed", [True, False], ids=["occupancy index", "calendar query"])
+async def test_heatmap_demand(api, bookings, monkeypatch, indexed):
+    if indexed:
+        await resource_routes.occupancy_index.rebuild(resource_routes.db)
+    else:
+        monkeypatch.setattr(resource_routes, "occupancy_index", OccupancyIndex())
+
+    response = await api.get("/api/resources/heatmap", params=dict(RANGE, granularity="day"))
+    assert response.status_code == 200
+    heatmap = response.json()
+    assert heatmap["periods"] == 14
+    printers = next(row for row in heatmap["resources"] if row["id"] == "imprimantes3D")
+    assert printers["periods"] == [1, 8]
+    assert printers["demand"] == [4, 1]
+    assert printers["over_capacity"] == [1]
+    assert printers["peak_utilization"] == round(4 / printers["capacity"], 4)
+
+    response = await api.get("/api/resources/heatmap", params=dict(RANGE, granularity="week", format="npz"))
+    archive = np.load(io.BytesIO(response.content))
+    row = list(archive["resource_ids"]).index("imprimantes3D")
+    assert archive["demand"][row].tolist() == [4, 1]
@@ -0,0 +1,43 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_events_pagination(api):
+    # Five events on one date, so pages split within a date
+    dates = ["2025-05-06"] * 5 + ["2025-05-07"] * 2
+    response = await api.post("/api/calendar/events/bulk", json=[
+        {"title": f"Séance {i}", "unit_id": 2, "date": date, "duration": 1, "resources": []}
+        for i, date in enumerate(dates)
+    ])
+    created = sorted((event["date"], event["id"]) for event in response.json()["created"])
+    assert len(created) == len(dates)
+
+    params = {"start": "2025-05-06", "end": "2025-05-07", "limit": 2}
+    pages = []
+    while True:
+        response = await api.get("/api/calendar/events", params=params)
+        assert response.status_code == 200
+        pages.append([(event["date"], event["id"]) for event in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params["cursor"] = cursor
+
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert [event for page in pages for event in page] == created
+
+async def test_events_pagination_last_full_page(api):
+    response = await api.post("/api/calendar/events/bulk", json=[
+        {"title": f"Séance {i}", "unit_id": 2, "date": "2025-05-06", "duration": 1, "resources": []}
+        for i in range(2)
+    ])
+    assert len(response.json()["created"]) == 2
+
+    response = await api.get("/api/calendar/events", params={"start": "2025-05-06", "limit": 2})
+    assert len(response.json()) == 2
+    assert "X-Next-Cursor" not in response.headers
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "bm90IGpzb24=", "WzFd"])
+async def test_events_invalid_cursor(api, cursor):
+    response = await api.get("/api/calendar/events", params={"limit": 2, "cursor": cursor})
+    assert response.status_code == 400
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+from reportlab import rl_config
+
+from models.settings import PDFExportOptions
+from services import pdf_generator
+from services.course_data import load_course_data
+from services.pdf_fragments import unit_fragments
+from utils import database
+
+pytestmark = pytest.mark.anyio
+
+class FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 1, 6, 8, 30)
+
+@pytest.fixture
+def render(monkeypatch):
+    """Render the stored course byte for byte reproducibly, with or without the fragment cache"""
+    monkeypatch.setattr(pdf_generator, "datetime", FixedDatetime)
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    options = PDFExportOptions()
+
+    async def render(cached=True):
+        if not cached:
+            unit_fragments.clear()
+        course = await load_course_data(options)
+        return pdf_generator.PDFGenerator().generate_course_pdf(*course, options)
+
+    return render
+
+async def edit_lesson(api):
+    response = await api.put("/api/units/2/lessons/201", json={"title": "Prototypage rapide"})
+    assert response.status_code == 200
+
+async def edit_lesson_in_same_millisecond(api):
+    # Leaves updated_at as it was, as two writes within one millisecond would
+    result = await database.db.units.update_one(
+        {"id": 2, "lessons.id": 201}, {"$set": {"lessons.$.title": "Prototypage rapide"}}
+    )
+    assert result.modified_count == 1
+
+async def delete_printers(api):
+    response = await api.delete("/api/resources/imprimantes3D")
+    assert response.status_code == 200
+
+# Units 2 and 4 have lessons using the 3D printers
+@pytest.mark.parametrize("change, units_changed", [
+    (edit_lesson, 1), (edit_lesson_in_same_millisecond, 1), (delete_printers, 2)
+], ids=["lesson edited", "lesson edited in the same millisecond", "resource deleted"])
+async def test_cached_fragments_match_a_full_render(api, render, change, units_changed):
+    await render()
+    misses = unit_fragments.misses
+
+    await change(api)
+    assembled = await render()
+
+    # Only the changed units are built again
+    assert unit_fragments.misses == misses + units_changed
+    assert assembled == await render(cached=False)
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from services.pdf_pool import PDFRenderPool
+
+pytestmark = pytest.mark.anyio
+
+async def test_timed_out_render_recycles_its_worker():
+    pool = PDFRenderPool(max_workers=1, max_queue=1)
+    try:
+        stuck_pid = await pool.run(os.getpid)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(time.sleep, 60, timeout=0.5)
+        assert pool.recycled == 1
+
+        # The slot comes back with a fresh worker instead of waiting out the render
+        started = time.monotonic()
+        fresh_pid = await pool.run(os.getpid, timeout=30)
+        assert fresh_pid != stuck_pid
+        assert time.monotonic() - started < 30
+        assert pool._pending == 0
+    finally:
+        pool.shutdown()
+
+async def test_abandoned_render_is_still_stopped_at_its_deadline():
+    pool = PDFRenderPool(max_workers=1, max_queue=1)
+    try:
+        # The caller goes away, as on a client disconnect, but the render hangs on
+        caller = asyncio.create_task(pool.run(time.sleep, 60, timeout=0.5))
+        await asyncio.sleep(0.1)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+
+        started = time.monotonic()
+        await pool.run(os.getpid, timeout=30)
+        assert time.monotonic() - started < 30
+        assert pool.recycled == 1
+        assert pool._pending == 0
+    finally:
+        pool.shutdown()
+
+async def test_finished_renders_keep_their_worker():
+    pool = PDFRenderPool(max_workers=2, max_queue=0)
+    try:
+        first = await pool.run(os.getpid)
+        assert await pool.run(os.getpid) == first
+        assert pool.recycled == 0
+    finally:
+        pool.shutdown()
@@ -0,0 +1,31 @@
+import pytest
+
+from utils.database import INDEXES, DatabaseManager
+
+pytestmark = pytest.mark.anyio
+
+def without_index(collection, name):
+    return [index for index in INDEXES[collection] if index.document["name"] != name]
+
+async def test_query_shapes_use_the_indexes(server, database):
+    await DatabaseManager.ensure_indexes()
+    await DatabaseManager.verify_query_plans()
+
+async def test_missing_index_is_reported(server, database, monkeypatch):
+    monkeypatch.setitem(INDEXES, "calendar_events", without_index("calendar_events", "date_1_id_1"))
+    await DatabaseManager.ensure_indexes()
+
+    with pytest.raises(RuntimeError, match=r"Collection scans in query plans: calendar_events \{\} sort="):
+        await DatabaseManager.verify_query_plans()
+
+async def test_collection_scan_stops_startup(server, database, monkeypatch):
+    monkeypatch.setitem(INDEXES, "units", without_index("units", "lessons.resources_1"))
+
+    with pytest.raises(RuntimeError, match="lessons.resources"):
+        async with server.app.router.lifespan_context(server.app):
+            pass
+
+    # Downgraded to a warning, the same plans let the server start
+    monkeypatch.setattr(server, "QUERY_PLAN_CHECK", "warn")
+    async with server.app.router.lifespan_context(server.app):
+        pass
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+
+from models.calendar import CalendarEvent
+from models.resource import Resource
+from models.unit import Lesson, Unit
+
+pytestmark = pytest.mark.anyio
+
+async def test_missing_optional_fields_are_filled(api, database):
+    # Documents written before their optional fields existed
+    now = datetime.utcnow()
+    await database.units.insert_one({
+        "id": 90, "title": "Ancienne unité", "duration": 4, "description": "",
+        "lessons": [{"id": 9001, "title": "Leçon", "duration": 2, "content": ""}],
+        "created_at": now, "updated_at": now
+    })
+    await database.calendar_events.insert_one({
+        "id": 9000, "title": "Ancienne séance", "unit_id": 90, "date": "2025-03-04", "duration": 2,
+        "created_at": now, "updated_at": now
+    })
+    await database.resources.insert_one({
+        "id": "ancienne", "name": "Ancienne", "quantity": 1, "description": "", "availability": "",
+        "created_at": now
+    })
+
+    unit = (await api.get("/api/units/90")).json()
+    assert sorted(unit) == sorted(Unit.model_fields)
+    assert unit["objectives"] == []
+    assert sorted(unit["lessons"][0]) == sorted(Lesson.model_fields)
+    assert unit["lessons"][0]["resources"] == []
+    assert unit in (await api.get("/api/units/")).json()
+
+    event = (await api.get("/api/calendar/events/9000")).json()
+    assert sorted(event) == sorted(CalendarEvent.model_fields)
+    assert event["lesson_id"] is None
+    assert event["resources"] == []
+    assert event in (await api.get("/api/calendar/events", params={"unit_id": 90})).json()
+    weeks = (await api.get("/api/calendar/weeks")).json()
+    assert event in [week_event for week in weeks for week_event in week["events"]]
+
+    resource = (await api.get("/api/resources/ancienne")).json()
+    assert sorted(resource) == sorted(Resource.model_fields)
+    assert resource["updated_at"]
@@ -0,0 +1,34 @@
+import pytest
+
+from utils.database import DatabaseManager
+
+pytestmark = pytest.mark.anyio
+
+async def test_duplicate_ids_stop_startup(server, database):
+    await database.units.insert_many([
+        {"id": 7, "title": "Copie A", "duration": 1, "lessons": []},
+        {"id": 7, "title": "Copie B", "duration": 1, "lessons": []},
+        {"id": 8, "title": "Unique", "duration": 1, "lessons": []},
+    ])
+
+    with pytest.raises(RuntimeError, match=r"units: id=7 \(2 documents\)"):
+        async with server.app.router.lifespan_context(server.app):
+            pass
+
+    # Counters are seeded first, so new units never reuse a stored ID
+    assert await DatabaseManager.reserve_ids("units") == 9
+    # The collections without duplicates are still indexed
+    assert "date_1_id_1" in await database.calendar_events.index_information()
+
+async def test_ensure_indexes_keeps_the_other_indexes(server, database):
+    await database.calendar_events.insert_many([
+        {"id": 1, "date": "2025-03-04"},
+        {"id": 1, "date": "2025-03-05"},
+    ])
+
+    with pytest.raises(RuntimeError, match=r"calendar_events: id=1 \(2 documents\)"):
+        await DatabaseManager.ensure_indexes()
+
+    indexes = await database.calendar_events.index_information()
+    assert "id_1" not in indexes
+    assert "date_1_id_1" in indexes